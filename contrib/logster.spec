@@ -13,7 +13,12 @@ BuildRoot:      %{_tmppath}/%{name}-%{version}-%{release}-root-%(%{__id_u} -n)
 
 BuildArch:      noarch
 BuildRequires:  python-devel
-Requires:       logcheck,python
+Requires:       python
+# logster has a built-in tailer, so logcheck's logtail2 is only needed for
+# --logtail. Older rpm versions don't know the Suggests tag.
+%if 0%{?fedora} || 0%{?rhel} >= 8
+Suggests:       logcheck, PyYAML, numpy, python-ujson
+%endif
 
 %description
 Logster is a utility for reading log files and generating metrics in Graphite
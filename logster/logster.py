@@ -29,18 +29,43 @@
 import os
 import sys
 import re
+import copy
+import json
 import optparse
+import multiprocessing
+import resource
 import stat
 import logging.handlers
 import fcntl
+import select
 import socket
+import signal
+import subprocess
+import struct
+import threading
+import cPickle
 import traceback
 
-from time import time, strftime, gmtime
+from time import time, strftime, gmtime, sleep
 from math import floor
 
+try:
+    from time import monotonic
+except ImportError:
+    # os.times()[4] is the elapsed real time since a fixed point in the past,
+    # which is not affected by changes to the system clock.
+    def monotonic():
+        return os.times()[4]
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
 # Local dependencies
-from logster_helper import LogsterParsingException, LockingError, CloudWatch, CloudWatchException
+from logster_helper import MetricObject, LogsterParser, LockingError, CloudWatch, CloudWatchException
+from logster_helper import LogTail, read_blocks, Gmetric, read_gmond_channels, parse_gmetric_options, NSCA
+from logster_helper import Spool
 
 # Globals
 gmetric = "/usr/bin/gmetric"
@@ -49,6 +74,42 @@ log_dir = "/var/log/logster"
 state_dir = "/var/run"
 send_nsca = "/usr/sbin/send_nsca"
 
+# Where metrics can be sent, in the order that outputs are started.
+outputs = ('ganglia', 'graphite', 'stdout', 'cloudwatch', 'nsca', 'statsd')
+
+# Seconds to wait for an output to send metrics, unless --output-timeout
+# says otherwise.
+output_timeout = 30
+
+# The share of an output's timeout that each of its socket operations gets.
+output_socket_timeout_share = 0.5
+
+# statsd types for the MetricObject types that aren't gauges. Ganglia gets
+# these as floats.
+statsd_types = {'counter': 'c', 'timer': 'ms'}
+
+# Native Ganglia senders, keyed by their options, that are reused between
+# submissions by long running processes.
+ganglia_senders = {}
+
+# CloudWatch clients, keyed by AWS key, that are reused between submissions
+# by long running processes.
+cloudwatch_clients = {}
+
+# Metrics per message for the Graphite pickle protocol.
+graphite_pickle_batch_size = 500
+
+# Metrics per send when replaying the spool of metrics that could not be
+# sent by an earlier run.
+spool_batch_size = 10000
+
+# Open Graphite connections, keyed by (host, port), that are reused between
+# submissions by long running processes.
+graphite_connections = {}
+
+# Don't bother splitting backlogs into chunks smaller than this for --shards.
+min_shard_size = 16 * 1024 * 1024
+
 script_start_time = time()
 
 # Logging infrastructure for use throughout the script.
@@ -65,10 +126,10 @@ logger.setLevel(logging.INFO)
 
 def get_cmdline_optparse():
     # Command-line options and parsing.
-    cmdline = optparse.OptionParser(usage="usage: %prog [options] parser logfile",
+    cmdline = optparse.OptionParser(usage="usage: %prog [options] parser[,parser...] logfile",
         description="Tail a log file and filter each line to generate metrics that can be sent to common monitoring packages.")
-    cmdline.add_option('--logtail', action='store', default=logtail,
-                        help='Specify location of logtail.  Default %s' % logtail)
+    cmdline.add_option('--logtail', action='store', default=None,
+                        help='Use the logtail program at this location (e.g. %s) instead of the built-in tailer.' % logtail)
     cmdline.add_option('--metric-prefix', '-p', action='store',
                         help='Add prefix to all published metrics. This is for people that may multiple instances of same service on same host.',
                         default='')
@@ -82,10 +143,19 @@ def get_cmdline_optparse():
     cmdline.add_option('--gmetric-options', action='store',
                         help='Options to pass to gmetric such as "-d 180 -c /etc/ganglia/gmond.conf" (default). These are passed directly to gmetric.',
                         default='-d 180 -c /etc/ganglia/gmond.conf')
+    cmdline.add_option('--use-gmetric', action='store_true', default=False,
+                        help='Run the gmetric program for each Ganglia metric instead of sending packets to the gmond.conf channels directly.')
+    cmdline.add_option('--ganglia-metadata-interval', action='store', type='int', default=60,
+                        help='Seconds between resending Ganglia metric metadata in --daemon mode. Default is \"%default\".')
     cmdline.add_option('--graphite-host', action='store',
                         help='Hostname and port for Graphite collector, e.g. graphite.example.com:2003')
+    cmdline.add_option('--graphite-protocol', action='store', default='plaintext',
+                       choices=('plaintext', 'pickle'),
+                       help="Protocol to send to Graphite with, 'plaintext' (usually port 2003) or 'pickle' (usually port 2004). Default is \"%default\".")
     cmdline.add_option('--statsd-host', action='store',
                         help='Hostname and port for statsd collector, e.g. statsd.example.com:8125')
+    cmdline.add_option('--statsd-mtu', action='store', type='int', default=1432,
+                        help='Largest statsd packet to send, in bytes. Metrics are packed into as few packets as fit. Default is \"%default\".')
     cmdline.add_option('--aws-key', action='store', default=os.getenv('AWS_ACCESS_KEY_ID'),
                         help='Amazon credential key')
     cmdline.add_option('--aws-secret-key', action='store', default=os.getenv('AWS_SECRET_ACCESS_KEY_ID'),
@@ -95,15 +165,43 @@ def get_cmdline_optparse():
     cmdline.add_option('--nsca-service-hostname', action='store',
                         help='<host_name> value to use in nsca passive service check. Default is \"%default\"',
                         default=socket.gethostname())
+    cmdline.add_option('--nsca-native', action='store_true', default=False,
+                        help='Send check results to NSCA directly instead of through send_nsca.')
+    cmdline.add_option('--nsca-password', action='store', default='',
+                        help='Password for --nsca-native.')
+    cmdline.add_option('--nsca-encryption', action='store', default='none', choices=('none', 'xor'),
+                        help='Encryption method for --nsca-native, \'none\' or \'xor\'. Default is \"%default\".')
+    cmdline.add_option('--nsca-output-length', action='store', type='int', default=4096,
+                        help='Plugin output size the NSCA server was built with, for --nsca-native: 4096 for NSCA 2.9, 512 for 2.7 and older. Default is \"%default\".')
+    cmdline.add_option('--self-metrics', action='store_true', default=False,
+                       help="Also send metrics about each run of logster itself: lines and bytes read, lines each parser matched, skipped and failed on, parse and output times, peak memory and so on.")
+    cmdline.add_option('--self-metric-prefix', action='store', default='logster',
+                       help='Name --self-metrics under this prefix, after any --metric-prefix. Default is \"%default\".')
     cmdline.add_option('--state-dir', '-s', action='store', default=state_dir,
                         help='Where to store the logtail state file.  Default location %s' % state_dir)
     cmdline.add_option('--log-dir', '-l', action='store', default=log_dir,
                         help='Where to store the logster logfile.  Default location %s' % log_dir)
     cmdline.add_option('--output', '-o', action='append',
-                       choices=('graphite', 'ganglia', 'stdout', 'cloudwatch', 'nsca', 'statsd'),
+                       choices=outputs,
                        help="Where to send metrics (can specify multiple times). Choices are 'graphite', 'ganglia', 'cloudwatch', 'nsca' , 'statsd', or 'stdout'.")
+    cmdline.add_option('--output-timeout', action='append', metavar='[OUTPUT=]SECONDS',
+                       help='Seconds to wait for the outputs, or for one output, e.g. "graphite=5", to send metrics. Outputs send at the same time, and one that fails or times out does not hold up the others. Can be given several times. Default is %s.' % output_timeout)
+    cmdline.add_option('--spool-max-size', action='store', type='int', default=16 * 1024 * 1024,
+                       help='Keep metrics that could not be sent to Graphite, and gauges that could not be sent to statsd, in a spool of up to this many bytes in --state-dir, and send them first on the next run. 0 turns the spool off. Default is \"%default\".')
+    cmdline.add_option('--spool-max-age', action='store', type='int', default=24 * 60 * 60,
+                       help='Drop spooled metrics older than this many seconds. Default is \"%default\".')
     cmdline.add_option('--stdout-separator', action='store', default="_", dest="stdout_separator",
                         help='Seperator between prefix/suffix and name for stdout. Default is \"%default\".')
+    cmdline.add_option('--shards', action='store', type='int', default=1,
+                        help='Split large backlogs into chunks parsed by up to this many processes. Needs a parser that implements merge(). Default is \"%default\".')
+    cmdline.add_option('--config', '-c', action='store',
+                        help='Run all of the jobs listed in this YAML (or JSON) file instead of a single parser and logfile.')
+    cmdline.add_option('--workers', action='store', type='int', default=None,
+                        help='Number of jobs from --config to run at the same time. Default is the number of CPUs.')
+    cmdline.add_option('--daemon', action='store_true', default=False,
+                        help='Keep running and submit metrics every --interval seconds instead of exiting after one pass.')
+    cmdline.add_option('--interval', action='store', type='float', default=60,
+                        help='Seconds between metric submissions in --daemon mode. Default is \"%default\".')
     cmdline.add_option('--dry-run', '-d', action='store_true', default=False,
                         help='Parse the log file but send stats to standard output.')
     cmdline.add_option('--debug', '-D', action='store_true', default=False,
@@ -120,6 +218,54 @@ def lineno():
     return inspect.currentframe().f_back.f_lineno
 
 
+def check_output_options(options):
+    """Return an error message if the output options are incomplete, or None."""
+    if not options.output:
+        return "Supply where the data should be sent with -o (or --output)."
+    if 'graphite' in options.output and not options.graphite_host:
+        return "You must supply --graphite-host when using 'graphite' as an output type."
+    if 'cloudwatch' in options.output and not options.aws_key and not options.aws_secret_key:
+        return "You must supply --aws-key and --aws-secret-key or Set environment variables. AWS_ACCESS_KEY_ID for --aws-key, AWS_SECRET_ACCESS_KEY_ID for --aws-secret-key"
+    if 'nsca' in options.output and not options.nsca_host:
+        return "You must supply --nsca-host when using 'nsca' as an output type."
+    try:
+        get_output_timeouts(options)
+    except ValueError, e:
+        return str(e)
+    return None
+
+
+def get_output_timeouts(options):
+    """
+    Return the timeout of each output from the --output-timeout values,
+    which are SECONDS for all outputs or OUTPUT=SECONDS for one.
+    """
+    timeouts = dict((output, output_timeout) for output in outputs)
+    values = options.output_timeout or []
+    if not isinstance(values, list):
+        values = [values]
+    for value in values:
+        value = str(value)
+        if '=' in value:
+            output, seconds = value.split('=', 1)
+            names = [output.strip()]
+        else:
+            seconds = value
+            names = outputs
+        for name in names:
+            if name not in timeouts:
+                raise ValueError("Unknown output '%s' in --output-timeout." % name)
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            raise ValueError("Invalid --output-timeout '%s', expected [OUTPUT=]SECONDS." % value)
+        if seconds <= 0:
+            raise ValueError("--output-timeout must be greater than zero.")
+        for name in names:
+            timeouts[name] = seconds
+    return timeouts
+
+
 def is_number(s):
     """Return True if is a numeric string or type, False otherwise."""
     try:
@@ -130,24 +276,155 @@ def is_number(s):
     pass
 
 
-def submit_stats(parser, duration, options):
-    metrics = parser.get_state(duration)
+class OutputThread(threading.Thread):
+    """ Sends metrics to one output, keeping any exception it fails with. """
 
-    if 'ganglia' in options.output:
-        submit_ganglia(metrics, options)
-    if 'graphite' in options.output:
-        submit_graphite(metrics, options)
-    if 'stdout' in options.output:
-        submit_stdout(metrics, options)
-    if 'cloudwatch' in options.output:
-        submit_cloudwatch(metrics, options)
-    if 'nsca' in options.output:
-        submit_nsca(metrics, options)
-    if 'statsd' in options.output:
-        submit_statsd(metrics, options)
+    def __init__(self, output, metrics, options, timeout):
+        threading.Thread.__init__(self, name='logster-%s' % output)
+        # Don't keep the process alive for an output that has timed out.
+        self.daemon = True
+        self.output = output
+        self.metrics = metrics
+        self.options = options
+        self.timeout = timeout
+        self.error = None
+        self.elapsed = None
 
+    def run(self):
+        # time() rather than monotonic(), which may only count in 10ms steps.
+        started = time()
+        try:
+            try:
+                # Give sockets part of the timeout, so that an output that
+                # hangs gives up, and lets go of its spool, before it is
+                # waited for no longer.
+                output_senders[self.output](self.metrics, self.options, self.timeout * output_socket_timeout_share)
+            except Exception, e:
+                self.error = e
+                logger.debug(traceback.format_exc())
+        finally:
+            self.elapsed = time() - started
+
+
+def submit_stats(parser, duration, options, stats=None):
+    """
+    Send the parser's metrics with submit_metrics(). A ParserGroup sends the
+    metrics of each of its parsers with that parser's options. Returns a
+    list of the outputs that failed.
+    """
+    if isinstance(parser, ParserGroup):
+        failed = []
+        for member, member_options in zip(parser.parsers, parser.options):
+            failed += submit_stats(member, duration, member_options, stats)
+        return failed
 
-def submit_stdout(metrics, options):
+    return submit_metrics(parser.get_state(duration), options, stats)
+
+
+def submit_metrics(metrics, options, stats=None):
+    """
+    Send metrics to each of options.output at the same time, waiting for
+    each at most its --output-timeout, and add the time each took to stats.
+    Logs the outputs that failed and returns a list of them.
+    """
+    timeouts = get_output_timeouts(options)
+
+    threads = [OutputThread(output, metrics, options, timeouts[output])
+               for output in outputs if output in options.output]
+    # Outputs that only print run here, after the others have started, so
+    # that their lines don't interleave.
+    printing = [thread for thread in threads if options.dry_run or thread.output == 'stdout']
+
+    started = monotonic()
+    for thread in threads:
+        if thread not in printing:
+            thread.start()
+    for thread in printing:
+        thread.run()
+
+    failed = []
+    for thread in threads:
+        if thread not in printing:
+            thread.join(max(0, started + thread.timeout - monotonic()))
+        if stats is not None:
+            if thread.elapsed is None:
+                stats.add_submit_time(thread.output, thread.timeout)
+            else:
+                stats.add_submit_time(thread.output, thread.elapsed)
+        if thread.is_alive():
+            logger.error("Output %s timed out after %s seconds" % (thread.output, thread.timeout))
+        elif thread.error is not None:
+            logger.error("Output %s failed: %s" % (thread.output, thread.error))
+        else:
+            logger.debug("Output %s sent %s metrics" % (thread.output, len(metrics)))
+            continue
+        failed.append(thread.output)
+        spool_metrics(thread.output, metrics, options)
+
+    if stats is not None:
+        stats.metric_count += len(metrics)
+    return failed
+
+
+def cpu_time():
+    """ Return the CPU time used by this process and its finished children. """
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+class RunStats(object):
+    """ Measurements of one pass of logster itself, sent with --self-metrics. """
+
+    def __init__(self):
+        self.parse_time = 0.0
+        self.parse_cpu_time = 0.0
+        self.metric_count = 0
+        self.submit_times = {}
+
+    def add_submit_time(self, output, seconds):
+        self.submit_times[output] = self.submit_times.get(output, 0.0) + seconds
+
+    def get_metrics(self, parser, prefix):
+        """ Return the measurements and parser's counts of lines as metrics
+            named under prefix. """
+        if prefix:
+            prefix += '.'
+
+        # ru_maxrss is in kilobytes on Linux.
+        peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        lines_per_sec = 0.0
+        if self.parse_time > 0:
+            lines_per_sec = parser._lines_read / self.parse_time
+
+        metrics = [
+            MetricObject(prefix + 'bytes_read', parser._bytes_read, 'Bytes'),
+            MetricObject(prefix + 'lines_read', parser._lines_read, 'Lines'),
+            MetricObject(prefix + 'lines_per_sec', lines_per_sec, 'Lines per sec'),
+            MetricObject(prefix + 'parse_time', self.parse_time, 'Seconds'),
+            MetricObject(prefix + 'parse_cpu_time', self.parse_cpu_time, 'Seconds'),
+            MetricObject(prefix + 'peak_rss', peak_rss, 'kB'),
+            MetricObject(prefix + 'metrics', self.metric_count, 'Metrics'),
+        ]
+        for output, seconds in sorted(self.submit_times.items()):
+            metrics.append(MetricObject(prefix + 'submit_time.' + output, seconds, 'Seconds'))
+
+        # The parsers of a ParserGroup each see every line read.
+        for member, member_name in zip(member_parsers(parser), member_names(parser)):
+            name = prefix + member_name + '.'
+            matched = parser._lines_read - member._lines_skipped - member._lines_failed
+            metrics.append(MetricObject(name + 'lines_matched', matched, 'Lines'))
+            metrics.append(MetricObject(name + 'lines_skipped', member._lines_skipped, 'Lines'))
+            metrics.append(MetricObject(name + 'lines_failed', member._lines_failed, 'Lines'))
+        return metrics
+
+
+def submit_run_stats(stats, parser, options):
+    """ Send the --self-metrics of a pass, returning the outputs that failed. """
+    return submit_metrics(stats.get_metrics(parser, options.self_metric_prefix), options)
+
+
+def submit_stdout(metrics, options, timeout=None):
     for metric in metrics:
         metric_name = metric.name
 
@@ -157,7 +434,42 @@ def submit_stdout(metrics, options):
             metric_name = metric_name + options.stdout_separator + options.metric_suffix
         print "%s %s %s" %(metric.timestamp, metric_name, metric.value)
 
-def submit_ganglia(metrics, options):
+def ganglia_type(metric):
+    """Return the Ganglia value type for a metric."""
+    if metric.type in statsd_types:
+        return 'float'
+    return metric.type
+
+
+def keep_connections(options):
+    """ Return True if backend connections should be kept open between
+        submissions, as they are in --daemon and --config mode. """
+    return bool(options.daemon or options.config)
+
+
+def get_ganglia_sender(options):
+    """Return a native Ganglia sender for the channels in the gmond.conf named
+    by --gmetric-options, reusing the previous one if connections are kept."""
+    key = (options.gmetric_options, options.ganglia_metadata_interval)
+    sender = ganglia_senders.get(key)
+    if (sender is None):
+        settings = parse_gmetric_options(options.gmetric_options)
+        channels = read_gmond_channels(settings['conf'])
+        if (not channels):
+            raise Exception, "No udp_send_channel found in %s" % settings['conf']
+        sender = Gmetric(channels, tmax=settings['tmax'], dmax=settings['dmax'],
+                         group=settings['group'], spoof=settings['spoof'],
+                         metadata_interval=options.ganglia_metadata_interval)
+        if (keep_connections(options)):
+            ganglia_senders[key] = sender
+    return sender
+
+
+def submit_ganglia(metrics, options, timeout=None):
+    native = not (options.use_gmetric or options.dry_run)
+    if (native):
+        sender = get_ganglia_sender(options)
+
     for metric in metrics:
         metric_name = metric.name
 
@@ -171,7 +483,7 @@ def submit_ganglia(metrics, options):
             options.gmetric_options,
             metric_name,
             metric.value,
-            metric.type,
+            ganglia_type(metric),
             metric.units,
             metric.title,
             metric.desc,
@@ -179,42 +491,94 @@ def submit_ganglia(metrics, options):
         )
         logger.debug("Submitting Ganglia metric: %s" % gmetric_cmd)
 
-        if (not options.dry_run):
+        if (native):
+            sender.send(metric_name, ganglia_type(metric), metric)
+        elif (not options.dry_run):
             os.system("%s" % gmetric_cmd)
         else:
             print "%s" % gmetric_cmd
 
+    if (native and not keep_connections(options)):
+        sender.close()
+
 
-def submit_graphite(metrics, options):
+def send_graphite(host, port, payload, keep_open, timeout=None):
+    """ Send payload to Graphite, reusing a pooled connection if there is
+        one, and keep the connection for next time if keep_open is set. """
+    s = graphite_connections.pop((host, port), None)
+    if (s is not None and select.select([s], [], [], 0)[0]):
+        # Graphite never writes to us, so a readable socket has been closed.
+        logger.debug("Graphite connection to %s:%s was closed, reconnecting" % (host, port))
+        s.close()
+        s = None
+    if (s is None):
+        s = socket.create_connection((host, port), timeout)
+
+    try:
+        s.sendall(payload)
+    except:
+        s.close()
+        raise
+
+    if (keep_open):
+        graphite_connections[(host, port)] = s
+    else:
+        s.close()
+
+
+def submit_graphite(metrics, options, timeout=None):
     if (re.match("^[\w\.\-]+\:\d+$", options.graphite_host) == None):
         raise Exception, "Invalid host:port found for Graphite: '%s'" % options.graphite_host
 
-    if (not options.dry_run):
-        host = options.graphite_host.split(':')
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((host[0], int(host[1])))
+    records = graphite_records(metrics, options)
+    for metric_name, value, timestamp in records:
+        metric_string = "%s %s %s" % (metric_name, value, timestamp)
+        logger.debug("Submitting Graphite metric: %s" % metric_string)
 
-    try:
-        for metric in metrics:
-            metric_name = metric.name
+        if (options.dry_run):
+            print "%s %s" % (options.graphite_host, metric_string)
 
-            if (options.metric_prefix != ""):
-                metric_name = options.metric_prefix + "." + metric_name
-            if (options.metric_suffix is not None):
-                metric_name = metric_name + "." + options.metric_suffix
+    if (options.dry_run):
+        return
 
-            metric_string = "%s %s %s" % (metric_name, metric.value, metric.timestamp)
-            logger.debug("Submitting Graphite metric: %s" % metric_string)
+    host = options.graphite_host.split(':')
+    def send(records):
+        payload = graphite_payload(records, options.graphite_protocol)
+        send_graphite(host[0], int(host[1]), payload, keep_connections(options), timeout)
 
-            if (not options.dry_run):
-                s.sendall("%s\n" % metric_string)
-            else:
-                print "%s %s" % (options.graphite_host, metric_string)
-    finally:
-        if (not options.dry_run):
-            s.close()
+    deliver(send, records, get_spool('graphite', options.graphite_host, options))
+
+
+def graphite_records(metrics, options):
+    """ Return a (name, value, timestamp) record for Graphite of each metric. """
+    records = []
+    for metric in metrics:
+        metric_name = metric.name
+
+        if (options.metric_prefix != ""):
+            metric_name = options.metric_prefix + "." + metric_name
+        if (options.metric_suffix is not None):
+            metric_name = metric_name + "." + options.metric_suffix
+
+        records.append((metric_name, metric.value, metric.timestamp))
+    return records
 
-def submit_cloudwatch(metrics, options):
+
+def graphite_payload(records, protocol):
+    """ Return the message for Graphite of (name, value, timestamp) records
+        in the 'plaintext' or 'pickle' protocol. """
+    if (protocol == 'pickle'):
+        messages = []
+        for i in range(0, len(records), graphite_pickle_batch_size):
+            message = cPickle.dumps([(name, (timestamp, value)) for name, value, timestamp
+                                     in records[i:i + graphite_pickle_batch_size]], protocol=2)
+            messages.append(struct.pack("!L", len(message)) + message)
+        return "".join(messages)
+    return "".join(["%s %s %s\n" % (name, value, timestamp) for name, value, timestamp in records])
+
+
+def submit_cloudwatch(metrics, options, timeout=None):
+    cloudwatch_metrics = []
     for metric in metrics:
         metric_name = metric.name
 
@@ -223,33 +587,48 @@ def submit_cloudwatch(metrics, options):
         if (options.metric_suffix is not None):
             metric_name = metric_name + "." + options.metric_suffix
 
+        # Copy the metric so the other outputs still see the original values.
+        metric = copy.copy(metric)
         metric.timestamp = strftime("%Y%m%dT%H:%M:00Z", gmtime(metric.timestamp))
         metric.units = "None"
         metric_string = "%s %s %s" % (metric_name, metric.value, metric.timestamp)
         logger.debug("Submitting CloudWatch metric: %s" % metric_string)
 
         if (not options.dry_run):
-            try:
-                cw = CloudWatch(options.aws_key, options.aws_secret_key, metric).get_instance_id()
-            except CloudWatchException:
-                logger.debug("Is this machine really amazon EC2?")
-                sys.exit(1)
-
-            try:
-                cw.put_data()
-            except CloudWatchException, e:
-                logger.debug(e.message)
-                sys.exit(1)
+            cloudwatch_metrics.append(metric)
         else:
             print metric_string
 
+    if (not cloudwatch_metrics):
+        return
+
+    cw = cloudwatch_clients.pop(options.aws_key, None)
+    if (cw is None):
+        instance_id_file = os.path.join(options.state_dir, 'logster-ec2-instance-id')
+        cw = CloudWatch(options.aws_key, options.aws_secret_key, [], timeout=timeout or 10)
+        # Raises CloudWatchException if this is not an EC2 instance.
+        cw.get_instance_id(cache_file=instance_id_file)
 
-def submit_nsca(metrics, options):
+    try:
+        cw.put_data(cloudwatch_metrics)
+    except CloudWatchException:
+        cw.close()
+        raise
+
+    if (keep_connections(options)):
+        cloudwatch_clients[options.aws_key] = cw
+    else:
+        cw.close()
+
+
+def submit_nsca(metrics, options, timeout=None):
     if (re.match("^[\w\.\-]+\:\d+$", options.nsca_host) is None):
         raise Exception, "Invalid host:port found for NSCA: '%s'" % options.nsca_host
 
     host = options.nsca_host.split(':')
 
+    records = []
+    checks = []
     for metric in metrics:
         metric_name = metric.name
 
@@ -261,38 +640,164 @@ def submit_nsca(metrics, options):
         metric_string = "\t".join((options.nsca_service_hostname, metric_name, str(metric.value), metric.units,))
         logger.debug("Submitting NSCA status: %s" % metric_string)
 
-        nsca_cmd = "echo '%s' | %s -H %s -p %s" % (metric_string, send_nsca, host[0], host[1],)
-
-        if (not options.dry_run):
-            os.system(nsca_cmd)
+        if (options.dry_run):
+            print "%s %s" % (options.nsca_host, metric_string)
+        elif (not options.nsca_native):
+            records.append(metric_string)
+        elif (is_number(metric.value)):
+            checks.append((options.nsca_service_hostname, metric_name, int(float(metric.value)), metric.units))
         else:
-            print "%s" % nsca_cmd
+            print("WARNING: Cannot send %s to NSCA, %s is not a numeric return code." % (metric_name, metric.value))
 
+    if (checks):
+        NSCA(host[0], int(host[1]), options.nsca_password, options.nsca_encryption, timeout or 10,
+             options.nsca_output_length).send(checks)
+
+    if (records):
+        # send_nsca reads any number of check results separated by ETB.
+        nsca_cmd = [send_nsca, '-H', host[0], '-p', host[1]]
+        try:
+            process = subprocess.Popen(nsca_cmd, stdin=subprocess.PIPE)
+        except OSError, e:
+            raise Exception, "Cannot run %s: %s" % (send_nsca, e)
+        process.communicate("\x17".join(records))
+        if (process.returncode != 0):
+            raise Exception, "%s returned bad exit code %s" % (" ".join(nsca_cmd), process.returncode)
+
+
+def pack_statsd_packets(metric_strings, mtu):
+    """Join metric strings with newlines into as few packets of at most mtu
+    bytes as possible. A metric longer than mtu is sent on its own."""
+    packets = []
+    packet = []
+    packet_size = 0
+    for metric_string in metric_strings:
+        if (packet and packet_size + 1 + len(metric_string) <= mtu):
+            packet.append(metric_string)
+            packet_size += 1 + len(metric_string)
+        else:
+            if (packet):
+                packets.append("\n".join(packet))
+            packet = [metric_string]
+            packet_size = len(metric_string)
+    if (packet):
+        packets.append("\n".join(packet))
+    return packets
 
-def submit_statsd(metrics, options):
-    if (not options.dry_run):
-        host = options.statsd_host.split(':')
-        host[0] = socket.gethostbyname(host[0])
 
+def submit_statsd(metrics, options, timeout=None):
     for metric in metrics:
-        metric_name = metric.name
+        if (not is_number(metric.value)):
+            print("WARNING: Cannot send %s to statsd, %s is not a numeric value." % (metric.name, metric.value))
+
+    metric_strings = statsd_records(metrics, options)
+    for metric_string in metric_strings:
+        logger.debug("Submitting statsd metric: %s" % metric_string)
+
+        if (options.dry_run):
+            print "%s %s" % (options.statsd_host, metric_string)
+
+    if (options.dry_run):
+        return
+
+    host = options.statsd_host.split(':')
+    def send(metric_strings):
+        udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # Connected, so that the errors the kernel hears of, such as
+            # nothing listening on the port, are raised.
+            udp_sock.connect((socket.gethostbyname(host[0]), int(host[1])))
+            for packet in pack_statsd_packets(metric_strings, options.statsd_mtu):
+                udp_sock.send(packet)
+        finally:
+            udp_sock.close()
+
+    deliver(send, metric_strings, get_spool('statsd', options.statsd_host, options))
 
+
+def statsd_records(metrics, options):
+    """ Return the statsd string of each metric with a numeric value. """
+    metric_strings = []
+    for metric in metrics:
         if (not is_number(metric.value)):
-            print("WARNING: Cannot send %s to statsd, %s is not a numeric value." % (metric_name, metric.value))
             continue
 
+        metric_name = metric.name
         if (options.metric_prefix != ""):
             metric_name = options.metric_prefix + '.' + metric_name
         if (options.metric_suffix is not None):
             metric_name = metric_name + '.' + options.metric_suffix
-        metric_string = "%s:%s|g" % (metric_name, metric.value)
-        logger.debug("Submitting statsd metric: %s" % metric_string)
+        metric_strings.append("%s:%s|%s" % (metric_name, metric.value, statsd_types.get(metric.type, 'g')))
+    return metric_strings
 
-        if (not options.dry_run):
-            udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            udp_sock.sendto(metric_string, (host[0], int(host[1])))
-        else:
-            print "%s %s" % (options.statsd_host, metric_string)
+
+def statsd_spool_records(metrics, options):
+    """ Return the statsd strings of the gauges among metrics. statsd has no
+        timestamps, so a count or timing sent by a later run would be added
+        to the wrong interval. """
+    return statsd_records([metric for metric in metrics if metric.type not in statsd_types], options)
+
+
+# The function that sends metrics to each output.
+output_senders = {
+    'ganglia': submit_ganglia,
+    'graphite': submit_graphite,
+    'stdout': submit_stdout,
+    'cloudwatch': submit_cloudwatch,
+    'nsca': submit_nsca,
+    'statsd': submit_statsd,
+}
+
+
+# For each output that keeps metrics it could not send in a spool, the
+# option naming where it sends them and the function that returns the
+# records of metrics to spool.
+spooled_outputs = {
+    'graphite': ('graphite_host', graphite_records),
+    'statsd': ('statsd_host', statsd_spool_records),
+}
+
+
+def get_spool(output, destination, options):
+    """ Return the Spool under --state-dir for metrics that output could not
+        send to destination, or None if --spool-max-size turns it off or
+        there is no destination. """
+    if (options.spool_max_size <= 0 or not destination):
+        return None
+    spool_file = 'logster-spool-%s-%s.spool' % (output, re.sub('[^\w.-]', '_', destination))
+    return Spool(os.path.join(options.state_dir, spool_file), options.spool_max_size, options.spool_max_age)
+
+
+def deliver(send, records, spool):
+    """
+    Call send with the records that spool kept from earlier runs, in large
+    batches, and then with records. The records of an output that fails or
+    times out are spooled by submit_metrics() with spool_metrics().
+    """
+    if (spool is not None):
+        sent = spool.replay(send, spool_batch_size)
+        if (sent):
+            logger.info("Sent %s metrics from the spool %s" % (sent, spool.path))
+    if (records):
+        send(records)
+
+
+def spool_metrics(output, metrics, options):
+    """ Keep the records of metrics that output failed to send in its spool,
+        for the next run to send first. """
+    if (output not in spooled_outputs or options.dry_run):
+        return
+    destination, get_records = spooled_outputs[output]
+    destination = getattr(options, destination)
+    spool = get_spool(output, destination, options)
+    if (spool is None):
+        return
+    records = get_records(metrics, options)
+    try:
+        if (spool.append(records)):
+            logger.warning("Spooled %s metrics in %s" % (len(records), spool.path))
+    except Exception, e:
+        logger.error("Cannot spool metrics for %s %s: %s" % (output, destination, e))
 
 
 def start_locking(lockfile_name):
@@ -329,30 +834,201 @@ def end_locking(lockfile_fd, lockfile_name):
     logger.debug("Unlocking successful")
     return
 
-def parse(class_name, log_file, options):
-    if (options.debug):
-        logger.setLevel(logging.DEBUG)
-
-    state_dir  = options.state_dir
-    log_dir    = options.log_dir
-    logtail    = options.logtail
-
+def get_state_files(class_name, log_file, state_dir):
+    """ Return the state and lock file names for a parser and log file. """
     dirsafe_logfile = log_file.replace('/','-')
     logtail_state_file = '%s/logtail-%s%s.state' % (state_dir, class_name, dirsafe_logfile)
     logtail_lock_file  = '%s/logtail-%s%s.lock' % (state_dir, class_name, dirsafe_logfile)
-    shell_tail = "%s -f %s -o %s" % (logtail, log_file, logtail_state_file)
+    return (logtail_state_file, logtail_lock_file)
 
+
+def load_parser(class_name):
+    """ Import and return the parser class named by class_name. """
     if class_name.find('.') == -1:
         # If it's a single name, find it in the base logster package
         class_name = 'parsers.%s.%s' % (class_name, class_name)
 
+    module_name, parser_name = class_name.rsplit('.', 1)
+    module = __import__(module_name, globals(), locals(), [parser_name])
+    return getattr(module, parser_name)
+
+
+def parser_specs(class_name, options):
+    """
+    Return a (class_name, options) pair for each parser of a run. class_name
+    is a parser name, several names separated by commas that share options,
+    or a list of such pairs from load_jobs(), which is returned as it is.
+    """
+    if not isinstance(class_name, basestring):
+        return class_name
+    return [(name, options) for name in class_name.split(',')]
+
+
+def specs_name(specs):
+    """ Return the name that the parsers in specs share state files under. """
+    return ','.join([class_name for class_name, options in specs])
+
+
+class ParserGroup(LogsterParser):
+    """
+    Several parsers of the same log file, each with its own options, that
+    are all handed each block of lines from a single read of the log.
+    """
+
+    def __init__(self, parsers, options):
+        self.parsers = parsers
+        self.options = options
+
+    def parse_lines(self, lines):
+        # Join the lists of lines from logtail once, not in every parser.
+        if not isinstance(lines, basestring):
+            lines = ''.join(lines)
+        for parser in self.parsers:
+            parser.parse_lines(lines)
+
+    def merge(self, other):
+        for parser, shard in zip(self.parsers, other.parsers):
+            merge_parser(parser, shard)
+
+
+def new_parser(specs):
+    """ Instantiate the parsers in specs, in a ParserGroup if there are several. """
+    parsers = [load_parser(class_name)(option_string=options.parser_options)
+               for class_name, options in specs]
+    if len(parsers) == 1:
+        return parsers[0]
+    return ParserGroup(parsers, [options for class_name, options in specs])
+
+
+def member_parsers(parser):
+    """ Return the parsers of a ParserGroup, or a list of the parser itself. """
+    if isinstance(parser, ParserGroup):
+        return parser.parsers
+    return [parser]
+
+
+def member_names(parser):
+    """ Return a name for each of member_parsers(parser): its class name,
+        followed by its position in the group if the group has several
+        parsers of that class. """
+    class_names = [type(member).__name__ for member in member_parsers(parser)]
+    return [class_names.count(name) > 1 and '%s.%s' % (name, i) or name
+            for i, name in enumerate(class_names)]
+
+
+def merge_parser(parser, shard):
+    """ Merge shard into parser, along with its counts of lines. """
+    parser.merge(shard)
+    parser._lines_skipped += shard._lines_skipped
+    parser._lines_failed += shard._lines_failed
+    parser._lines_read += shard._lines_read
+    parser._bytes_read += shard._bytes_read
+
+
+def feed_parser(parser, blocks, count_lines=False):
+    """ Hand each block of lines from blocks to the parser, counting the
+        bytes, and the lines if count_lines is set. """
+    lines_read = bytes_read = 0
+    for block in blocks:
+        parser.parse_lines(block)
+        if isinstance(block, basestring):
+            if count_lines:
+                lines_read += block.count('\n')
+            bytes_read += len(block)
+        else:
+            lines_read += len(block)
+            bytes_read += sum([len(line) for line in block])
+    parser._lines_read += lines_read
+    parser._bytes_read += bytes_read
+
+
+def log_line_counts(parser, log_file):
+    """ Log how many lines of log_file the parser skipped or failed on. """
+    for member, name in zip(member_parsers(parser), member_names(parser)):
+        logger.info("%s skipped %s lines and failed to parse %s lines of %s" %
+                    (name, member._lines_skipped, member._lines_failed, log_file))
+
+
+def read_pipe_blocks(input, block_size=1024 * 1024):
+    """ Yield lists of about block_size bytes of lines from a pipe. """
+    return iter(lambda: input.readlines(block_size), [])
+
+
+def can_shard(parser, options):
+    """ Return True if parse() should split the backlog across processes. """
+    if options.shards < 2 or options.logtail:
+        return False
+    for member in member_parsers(parser):
+        if type(member).merge.__func__ is LogsterParser.merge.__func__:
+            logger.debug("%s does not implement merge(); not using --shards" % type(member).__name__)
+            return False
+    # Pool workers, e.g. from run_jobs(), can't start pools of their own.
+    return not multiprocessing.current_process().daemon
+
+
+def parse_range(job):
+    """ Parse one chunk from LogTail.split() with new parser instances. """
+    specs, path, start, end, count_lines = job
+    parser = new_parser(specs)
+    f = open(path, 'rb')
+    try:
+        feed_parser(parser, read_blocks(f, start, end), count_lines)
+    finally:
+        f.close()
+    return parser
+
+
+def parse_shards(parser, specs, tailer, options):
+    """
+    Split the unread part of the log into line-aligned chunks, parse them in
+    a pool of options.shards processes and merge the results into parser in
+    log order.
+    """
+    jobs = [(specs, path, start, end, options.self_metrics)
+            for path, start, end in tailer.split(options.shards, min_shard_size)]
+    logger.debug("Parsing %s chunks of %s" % (len(jobs), tailer.log_file))
+
+    if len(jobs) > 1:
+        pool = multiprocessing.Pool(min(options.shards, len(jobs)))
+        try:
+            shards = pool.map(parse_range, jobs, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        shards = map(parse_range, jobs)
+
+    for shard in shards:
+        merge_parser(parser, shard)
+
+
+def parse(class_name, log_file, options, stats=None):
+    """
+    Parse the new lines of log_file with the parser class_name, or with
+    each of several parsers from a single read of it (see parser_specs()).
+    Returns the parser, or a ParserGroup of them, and the duration. Times
+    the parsing in stats, a RunStats, if given.
+    """
+    if (options.debug):
+        logger.setLevel(logging.DEBUG)
+
+    state_dir  = options.state_dir
+    log_dir    = options.log_dir
+    logtail    = options.logtail
+
+    specs = parser_specs(class_name, options)
+    class_name = specs_name(specs)
+    logtail_state_file, logtail_lock_file = get_state_files(class_name, log_file, state_dir)
+    if logtail:
+        shell_tail = "%s -f %s -o %s" % (logtail, log_file, logtail_state_file)
+    else:
+        tailer = LogTail(log_file, logtail_state_file)
+
     logger.info("Executing parser %s on logfile %s" % (class_name, log_file))
     logger.debug("Using state file %s" % logtail_state_file)
 
-    # Import and instantiate the class from the module passed in.
-    module_name, parser_name = class_name.rsplit('.', 1)
-    module = __import__(module_name, globals(), locals(), [parser_name])
-    parser = getattr(module, parser_name)(option_string=options.parser_options)
+    # Import and instantiate the classes from the modules passed in.
+    parser = new_parser(specs)
 
     # Check for lock file so we don't run multiple copies of the same parser
     # simultaneuosly. This will happen if the log parsing takes more time than
@@ -379,15 +1055,23 @@ def parse(class_name, log_file, options):
 
         except OSError, e:
             logger.info('Writing new state file and exiting. (Was either first run, or state file went missing.)')
-            input = os.popen(shell_tail)
-            retval = input.close()
-            if (retval != 256):
-                logger.warning('%s returned bad exit code %s' % (shell_tail, retval))
+            if logtail:
+                input = os.popen(shell_tail)
+                retval = input.close()
+                if (retval != 256):
+                    logger.warning('%s returned bad exit code %s' % (shell_tail, retval))
+            else:
+                tailer.seek_to_end()
+                tailer.write_state()
             end_locking(lockfile, logtail_lock_file)
             sys.exit(0)
 
-        # Open a pipe to read input from logtail.
-        input = os.popen(shell_tail)
+        if logtail:
+            # Open a pipe to read input from logtail.
+            input = read_pipe_blocks(os.popen(shell_tail))
+        else:
+            tailer.read_state()
+            input = tailer.blocks()
 
     except SystemExit, e:
         raise
@@ -395,20 +1079,26 @@ def parse(class_name, log_file, options):
     except Exception, e:
         # note - there is no exception when logtail doesn't exist.
         # I don't know when this exception will ever actually be triggered.
-        print ("Failed to run %s to get log data (line %s): %s" %
-               (shell_tail, lineno(), e))
+        if logtail:
+            print ("Failed to run %s to get log data (line %s): %s" %
+                   (shell_tail, lineno(), e))
+        else:
+            print ("Failed to read state for %s (line %s): %s" %
+                   (log_file, lineno(), e))
         end_locking(lockfile, logtail_lock_file)
         sys.exit(1)
 
     # Parse each line from input, then send all stats to their collectors.
     try:
-        for line in input:
-            try:
-                parser.parse_line(line)
-            except LogsterParsingException, e:
-                # This should only catch recoverable exceptions (of which there
-                # aren't any at the moment).
-                logger.debug("Parsing exception caught at %s: %s" % (lineno(), e))
+        parse_start, parse_cpu_start = time(), cpu_time()
+        if can_shard(parser, options):
+            parse_shards(parser, specs, tailer, options)
+        else:
+            feed_parser(parser, input, options.self_metrics)
+        if stats is not None:
+            stats.parse_time = time() - parse_start
+            stats.parse_cpu_time = cpu_time() - parse_cpu_start
+        log_line_counts(parser, log_file)
 
     except Exception, e:
         print "Exception caught at %s: %s" % (lineno(), e)
@@ -416,6 +1106,10 @@ def parse(class_name, log_file, options):
         end_locking(lockfile, logtail_lock_file)
         sys.exit(1)
 
+    if not logtail:
+        tailer.write_state()
+        tailer.close()
+
     # Log the execution time
     exec_time = round(time() - script_start_time, 1)
     logger.info("Total execution time: %s seconds." % exec_time)
@@ -435,9 +1129,213 @@ def parse(class_name, log_file, options):
 
     return (parser, duration)
 
+def run_daemon(class_name, log_file, options):
+    """
+    Keep the parser class and log file open and call submit_stats() every
+    options.interval seconds. Offsets are checkpointed to the same state file
+    that cron mode uses after every interval.
+    """
+    if (options.debug):
+        logger.setLevel(logging.DEBUG)
+
+    specs = parser_specs(class_name, options)
+    class_name = specs_name(specs)
+    logtail_state_file, logtail_lock_file = get_state_files(class_name, log_file, options.state_dir)
+
+    logger.info("Running parser %s on logfile %s every %s seconds" % (class_name, log_file, options.interval))
+    logger.debug("Using state file %s" % logtail_state_file)
+
+    # Fail early on a parser that can't be imported.
+    for spec_class_name, spec_options in specs:
+        load_parser(spec_class_name)
+
+    try:
+        lockfile = start_locking(logtail_lock_file)
+    except LockingError, e:
+        logger.warning("Failed to get lock. Is another instance of logster running?")
+        sys.exit(1)
+
+    # Make sure the lock is released when we are asked to stop.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    tailer = LogTail(log_file, logtail_state_file)
+    try:
+        if tailer.read_state():
+            # Account for the time since the last cron or daemon run, as parse() does.
+            state_file_age = os.stat(logtail_state_file)[stat.ST_MTIME]
+            last_submit = monotonic() - max(0, time() - state_file_age)
+        else:
+            logger.info('Writing new state file. (Was either first run, or state file went missing.)')
+            tailer.seek_to_end()
+            tailer.write_state()
+            last_submit = monotonic()
+
+        next_submit = monotonic() + options.interval
+        while True:
+            sleep(max(0, next_submit - monotonic()))
+
+            try:
+                stats = None
+                if options.self_metrics:
+                    stats = RunStats()
+
+                parser = new_parser(specs)
+                parse_start, parse_cpu_start = time(), cpu_time()
+                feed_parser(parser, tailer.blocks(), options.self_metrics)
+                if stats is not None:
+                    stats.parse_time = time() - parse_start
+                    stats.parse_cpu_time = cpu_time() - parse_cpu_start
+                tailer.write_state()
+                log_line_counts(parser, log_file)
+
+                now = monotonic()
+                submit_stats(parser, now - last_submit, options, stats)
+                last_submit = now
+                if stats is not None:
+                    submit_run_stats(stats, parser, options)
+            except Exception, e:
+                logger.error("Exception caught at %s: %s" % (lineno(), e))
+                logger.debug(traceback.format_exc())
+
+            # Start the next pass straight away if this one overran the interval.
+            next_submit = max(next_submit + options.interval, monotonic())
+
+    finally:
+        tailer.close()
+        end_locking(lockfile, logtail_lock_file)
+
+
 def main(class_name, log_file, options):
     """
-    Calls parse() and submit_stats()
+    Calls parse() and submit_stats(), and exits with 1 if any output failed
+    """
+    stats = None
+    if options.self_metrics:
+        stats = RunStats()
+    (parser, duration) = parse(class_name, log_file, options, stats)
+    failed = submit_stats(parser, duration, options, stats)
+    if stats is not None:
+        # Sent after the parser's metrics so that the time they took is known.
+        failed += submit_run_stats(stats, parser, options)
+    if failed:
+        sys.exit(1)
+
+
+def override_options(options, overrides, name):
+    """
+    Return a copy of options with the values in overrides, whose keys may
+    use dashes or underscores, checking that each names an option.
+    """
+    options = copy.copy(options)
+    for key, value in overrides.items():
+        key = key.replace('-', '_')
+        if not hasattr(options, key):
+            raise ValueError("Unknown option '%s' in job %s" % (key, name))
+        if key in ('output', 'output_timeout') and isinstance(value, basestring):
+            value = [value]
+        setattr(options, key, value)
+
+    output_error = check_output_options(options)
+    if output_error:
+        raise ValueError("%s (job %s)" % (output_error, name))
+    return options
+
+
+def load_jobs(config_file, options):
+    """
+    Read a list of jobs from config_file. The file holds a 'jobs' list, each
+    job giving at least 'parser' and 'log_file'. Any other key of a job
+    overrides the command line option of the same name, e.g.:
+
+        jobs:
+          - parser: SampleLogster
+            log_file: /var/log/httpd/access_log
+            output: [graphite]
+            metric_prefix: httpd
+
+    Instead of 'parser', a job can give a list of 'parsers' that share one
+    read of the log file. Each is a parser name, or a dict of 'parser' and
+    options that override the job's for that parser:
+
+          - log_file: /var/log/nginx/access.log
+            output: [graphite]
+            parsers:
+              - SampleLogster
+              - parser: LineCountLogster
+                metric_prefix: nginx
+
+    Returns a list of (name, specs, log_file, options) tuples, where specs
+    lists a (class_name, options) pair for each parser.
+    """
+    f = open(config_file)
+    try:
+        if yaml is not None:
+            config = yaml.safe_load(f)
+        else:
+            try:
+                config = json.load(f)
+            except ValueError, e:
+                raise ValueError("not valid JSON (%s), and PyYAML is required to read YAML" % e)
+    finally:
+        f.close()
+
+    jobs = []
+    for job in config['jobs']:
+        job = dict((key.replace('-', '_'), value) for key, value in job.items())
+        if 'parsers' in job:
+            parsers = [isinstance(parser, basestring) and {'parser': parser} or dict(parser)
+                       for parser in job.pop('parsers')]
+        else:
+            parsers = [{'parser': job.pop('parser')}]
+        log_file = job.pop('log_file')
+        name = job.pop('name', '%s %s' % (','.join([parser['parser'] for parser in parsers]), log_file))
+
+        job_options = override_options(options, job, name)
+        specs = [(parser.pop('parser'), override_options(job_options, parser, name))
+                 for parser in parsers]
+
+        jobs.append((name, specs, log_file, job_options))
+
+    return jobs
+
+
+def run_job(job):
     """
-    (parser, duration) = parse(class_name, log_file, options)
-    submit_stats(parser, duration, options)
+    Run a single job from load_jobs(), returning its name, whether it
+    succeeded and its wall time.
+    """
+    name, specs, log_file, options = job
+    start_time = time()
+    try:
+        main(specs, log_file, options)
+        succeeded = True
+    except SystemExit, e:
+        # parse() exits with 0 on a first run and 1 when it fails, and
+        # main() with 1 when an output fails.
+        succeeded = not e.code
+    except Exception, e:
+        logger.error("Job %s failed: %s" % (name, e))
+        logger.debug(traceback.format_exc())
+        succeeded = False
+    return (name, succeeded, time() - start_time)
+
+
+def run_jobs(jobs, workers=None):
+    """
+    Run jobs from load_jobs() in a pool of worker processes. Returns True if
+    all of them succeeded.
+    """
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(run_job, jobs, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+    for name, succeeded, wall_time in results:
+        if succeeded:
+            logger.info("Job %s finished in %.1f seconds." % (name, wall_time))
+        else:
+            logger.warning("Job %s failed after %.1f seconds." % (name, wall_time))
+
+    return all(succeeded for name, succeeded, wall_time in results)
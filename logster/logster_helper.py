@@ -25,9 +25,20 @@ except ImportError:
     from http.client import *
 
 import base64
+import fcntl
 import hashlib
 import hmac
+import json
+import logging
+import os
+import re
+import shlex
+import socket
+import struct
 import sys
+import zlib
+
+from io import BytesIO
 
 try:
     from urllib import urlencode, quote_plus
@@ -36,13 +47,17 @@ except ImportError:
 
 from time import time
 
+logger = logging.getLogger('logster')
+
 class MetricObject(object):
     """General representation of a metric that can be used in many contexts"""
-    def __init__(self, name, value, units='', type='float', timestamp=int(time()), title='', desc='',  slope=''):
+    def __init__(self, name, value, units='', type='float', timestamp=None, title='', desc='',  slope=''):
         self.name = name
         self.value = value
         self.units = units
         self.type = type
+        if timestamp is None:
+            timestamp = int(time())
         self.timestamp = timestamp
         self.desc = desc
         self.title = title
@@ -50,14 +65,76 @@ class MetricObject(object):
 
 class LogsterParser(object):
     """Base class for logster parsers"""
+
+    # What parse_line can return about a line. Returning nothing means MATCHED.
+    MATCHED = 'matched'
+    SKIPPED = 'skipped'
+    ERROR = 'error'
+
+    # Lines that parse_lines found of no interest, and lines that failed.
+    # These counts are private, so that they can't clash with a parser's
+    # own attributes.
+    _lines_skipped = 0
+    _lines_failed = 0
+
+    # Lines and bytes that logster handed to parse_lines. logster only counts
+    # the lines for --self-metrics.
+    _lines_read = 0
+    _bytes_read = 0
+
     def parse_line(self, line):
-        """Take a line and do any parsing we need to do. Required for parsers"""
+        """Take a line and do any parsing we need to do. Required for parsers.
+        Return SKIPPED for a line of no interest and ERROR for a line that
+        could not be parsed. Raising LogsterParsingException also marks the
+        line as failed, but is much slower when most lines don't match"""
         raise RuntimeError("Implement me!")
 
+    def parse_lines(self, lines):
+        """Take a buffer of newline terminated lines, or any iterable of lines,
+        and parse them. logster hands parsers large blocks of the log through
+        this method. The default calls parse_line for each line and counts
+        the lines skipped or failed. Optional; override it to scan a whole
+        block at once, calling count_skipped if you can"""
+        if isinstance(lines, bytes):
+            lines = BytesIO(lines)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        parse_line = self.parse_line
+        skipped = failed = 0
+        for line in lines:
+            try:
+                status = parse_line(line)
+            except LogsterParsingException as e:
+                failed += 1
+                if debug:
+                    logger.debug("Parsing exception caught: %s" % e)
+                continue
+            if status == self.SKIPPED:
+                skipped += 1
+            elif status == self.ERROR:
+                failed += 1
+                if debug:
+                    logger.debug("Failed to parse line: %r" % line)
+        self._lines_skipped += skipped
+        self._lines_failed += failed
+
+    def count_skipped(self, lines, matched):
+        """Count the lines of a block buffer other than the matched ones as
+        skipped, for parse_lines implementations that only see matches"""
+        total = lines.count(b'\n')
+        if lines and not lines.endswith(b'\n'):
+            total += 1
+        self._lines_skipped += total - matched
+
     def get_state(self, duration):
         """Run any calculations needed and return list of metric objects"""
         raise RuntimeError("Implement me!")
 
+    def merge(self, other):
+        """Fold the state of another instance of this parser, which parsed a
+        later part of the same log, into this one. Optional; parsers that
+        implement it can have large backlogs split across processes"""
+        raise NotImplementedError("%s does not support merge" % self.__class__.__name__)
+
 
 class LogsterParsingException(Exception):
     """Raise this exception if the parse_line function wants to
@@ -69,6 +146,329 @@ class LockingError(Exception):
     """ Exception raised for errors creating or destroying lockfiles. """
     pass
 
+class LogTail(object):
+    """ Native replacement for logtail2. Reads the complete lines appended to
+        a log file since the last run, keeping the inode and byte offset in a
+        logtail2 compatible state file. Rotation is detected by a change of
+        inode, in which case the remainder of the rotated file (log_file.1 or
+        log_file.0) is read first. A file shorter than the saved offset is
+        assumed to have been truncated and is read from the beginning. """
+
+    rotated_suffixes = ('.1', '.0')
+
+    def __init__(self, log_file, state_file, block_size=1024 * 1024):
+        self.log_file = log_file
+        self.state_file = state_file
+        self.block_size = block_size
+        self.fh = None
+        self.inode = None
+        self.offset = 0
+        self.bytes_read = 0
+
+    def read_state(self):
+        """ Load inode and offset from the state file. Returns False if there
+            is no usable state file. """
+        try:
+            f = open(self.state_file)
+            try:
+                self.inode = int(f.readline())
+                self.offset = int(f.readline())
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return False
+        return True
+
+    def write_state(self):
+        """ Save inode and offset to the state file. The file is replaced
+            rather than rewritten in place, so that a run killed while
+            writing it leaves the previous state. """
+        new_path = self.state_file + '.new'
+        f = open(new_path, 'w')
+        try:
+            f.write("%s\n%s\n" % (self.inode, self.offset))
+        finally:
+            f.close()
+        os.rename(new_path, self.state_file)
+
+    def seek_to_end(self):
+        """ Skip everything currently in the log file. """
+        self.close()
+        st = os.stat(self.log_file)
+        self.inode = st.st_ino
+        self.offset = st.st_size
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+    def _open(self, path, inode, offset):
+        self.close()
+        self.fh = open(path, 'rb')
+        self.inode = inode
+        self.offset = offset
+
+    def _open_from_state(self):
+        st = os.stat(self.log_file)
+        if self.inode is not None and self.inode != st.st_ino:
+            for suffix in self.rotated_suffixes:
+                try:
+                    rotated_st = os.stat(self.log_file + suffix)
+                except OSError:
+                    continue
+                if rotated_st.st_ino == self.inode:
+                    self._open(self.log_file + suffix, self.inode, self.offset)
+                    return
+            self.offset = 0
+        self._open(self.log_file, st.st_ino, self.offset)
+
+    def _open_files(self):
+        """ Yield the open file, switching to the new log file and yielding
+            again if it has been rotated since it was opened. """
+        if self.fh is None:
+            self._open_from_state()
+        if os.fstat(self.fh.fileno()).st_size < self.offset:
+            self.offset = 0
+        yield self.fh
+
+        try:
+            st = os.stat(self.log_file)
+        except OSError:
+            # Rotated but not yet recreated; pick it up on the next call.
+            return
+        if st.st_ino != self.inode:
+            self._open(self.log_file, st.st_ino, 0)
+            yield self.fh
+
+    def blocks(self):
+        """ Yield buffers of complete lines appended since the saved offset,
+            following the file across a rotation. The file handle is kept
+            open between calls. """
+        for fh in self._open_files():
+            for block in read_blocks(fh, self.offset, block_size=self.block_size):
+                self.offset += len(block)
+                self.bytes_read += len(block)
+                yield block
+
+    def split(self, chunks, min_chunk_size=0):
+        """ Return (path, start, end) byte ranges that cover the complete
+            lines appended since the saved offset in about the given number
+            of chunks, each ending on a line boundary, and move the offset
+            past them. The caller is responsible for reading the ranges. """
+        ranges = []
+        for fh in self._open_files():
+            start = self.offset
+            end = find_last_line_end(fh, start, os.fstat(fh.fileno()).st_size, self.block_size)
+            chunk_size = max(min_chunk_size, (end - start) // chunks + 1)
+            while start < end:
+                chunk_end = start + chunk_size
+                if chunk_end < end:
+                    fh.seek(chunk_end)
+                    chunk_end += len(fh.readline())
+                else:
+                    chunk_end = end
+                ranges.append((fh.name, start, chunk_end))
+                start = chunk_end
+            self.bytes_read += end - self.offset
+            self.offset = end
+        return ranges
+
+    def __iter__(self):
+        return iter_lines(self.blocks())
+
+
+def read_blocks(fh, start, end=None, block_size=1024 * 1024):
+    """ Yield buffers of complete lines read from fh between the byte offsets
+        start and end, or the end of the file. A trailing partial line is not
+        returned. """
+    fh.seek(start)
+    if end is None:
+        remaining = float('inf')
+    else:
+        remaining = end - start
+    pending = b''
+    while remaining > 0:
+        block = fh.read(min(block_size, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        block_end = block.rfind(b'\n') + 1
+        if block_end == 0:
+            pending += block
+            continue
+        yield pending + block[:block_end]
+        pending = block[block_end:]
+
+
+def find_last_line_end(fh, start, end, block_size=1024 * 1024):
+    """ Return the offset just past the last newline in fh between start and
+        end, or start if there is none. """
+    while end > start:
+        block_start = max(start, end - block_size)
+        fh.seek(block_start)
+        newline = fh.read(end - block_start).rfind(b'\n')
+        if newline != -1:
+            return block_start + newline + 1
+        end = block_start
+    return start
+
+
+def iter_lines(blocks):
+    """ Split buffers from read_blocks() into lines. """
+    for block in blocks:
+        for line in BytesIO(block):
+            yield line
+
+
+class Spool(object):
+    """ An append-only file of batches of metric records that could not be
+        sent, kept for a later run to send. Each line holds one batch as
+        JSON, with the time it was spooled. The oldest batches are dropped to
+        keep the file under max_size bytes, and batches older than max_age
+        seconds are dropped when it is read. The file is locked while it is
+        used, so that runs sharing it don't lose each other's batches, and
+        is replaced rather than rewritten in place, so that a run that dies
+        part way through leaves it whole. """
+
+    def __init__(self, path, max_size=16 * 1024 * 1024, max_age=24 * 60 * 60):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def _open(self):
+        while True:
+            f = open(self.path, 'a+')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # _write() may have replaced the file while we waited for the lock.
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except OSError:
+                pass
+            f.close()
+
+    def _read(self, f):
+        """ Return the (time, records) batches in f that are not too old. """
+        f.seek(0)
+        cutoff = time() - self.max_age
+        batches = []
+        for line in f:
+            try:
+                batch = json.loads(line)
+                spooled, records = batch['time'], batch['records']
+            except (ValueError, KeyError, TypeError):
+                # Left unfinished by a run that died while writing it.
+                continue
+            if spooled >= cutoff:
+                batches.append((spooled, records))
+        return batches
+
+    def _write(self, f, batches):
+        """ Replace the locked file f with one holding batches. """
+        new_path = self.path + '.new'
+        new = open(new_path, 'w')
+        try:
+            new.write(''.join([self._line(spooled, records) for spooled, records in batches]))
+        finally:
+            new.close()
+        os.rename(new_path, self.path)
+
+    def _line(self, spooled, records):
+        return json.dumps({'time': spooled, 'records': records}) + '\n'
+
+    def __len__(self):
+        """ Return the number of records in the spool. """
+        if not os.path.exists(self.path):
+            return 0
+        f = self._open()
+        try:
+            return sum([len(records) for spooled, records in self._read(f)])
+        finally:
+            f.close()
+
+    def append(self, records):
+        """ Add a batch of records, each a list or string that JSON can hold.
+            Returns False if there were none, or too many to fit. """
+        if not records:
+            return False
+        line = self._line(time(), records)
+        if len(line) > self.max_size:
+            logger.warning("Dropping %s metrics that don't fit in the spool %s" % (len(records), self.path))
+            return False
+
+        f = self._open()
+        try:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                # Don't add to a line left unfinished by a run that died.
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != '\n':
+                    line = '\n' + line
+                f.seek(0, os.SEEK_END)
+            if f.tell() + len(line) <= self.max_size:
+                f.write(line)
+                return True
+
+            # Drop the oldest batches to make room.
+            batches = self._read(f) + [(time(), records)]
+            size = sum([len(self._line(spooled, records)) for spooled, records in batches])
+            dropped = 0
+            while size > self.max_size:
+                spooled, oldest = batches.pop(0)
+                size -= len(self._line(spooled, oldest))
+                dropped += len(oldest)
+            if dropped:
+                logger.warning("Dropped the %s oldest metrics from the full spool %s" % (dropped, self.path))
+            self._write(f, batches)
+            return True
+        finally:
+            f.close()
+
+    def replay(self, send, batch_size=10000):
+        """ Call send with the spooled records, oldest first, in lists of
+            about batch_size. Stops at the first list that send raises an
+            exception for, keeping it and the rest in the spool, and raises
+            the exception again. Returns the number of records sent. """
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return 0
+
+        f = self._open()
+        try:
+            batches = self._read(f)
+            sent = 0
+            while batches:
+                count = len(batches[0][1])
+                end = 1
+                while end < len(batches) and count + len(batches[end][1]) <= batch_size:
+                    count += len(batches[end][1])
+                    end += 1
+                records = []
+                for spooled, batch in batches[:end]:
+                    records += [restore_strings(record) for record in batch]
+                try:
+                    send(records)
+                except Exception:
+                    self._write(f, batches)
+                    raise
+                batches = batches[end:]
+                sent += count
+            self._write(f, batches)
+            return sent
+        finally:
+            f.close()
+
+
+def restore_strings(value):
+    """ Turn the unicode strings that json gives back into the byte strings
+        they were on Python 2. """
+    if isinstance(value, list):
+        return [restore_strings(item) for item in value]
+    if sys.version_info[0] < 3 and hasattr(value, 'encode') and not isinstance(value, bytes):
+        return value.encode('utf-8')
+    return value
+
+
 class CloudWatchException(Exception):
     """ Raise thie exception if the connection can't be established 
         with Amazon server """
@@ -76,38 +476,83 @@ class CloudWatchException(Exception):
 
 class CloudWatch:
     """ Base class for Amazon CloudWatch """
-    def __init__(self, key, secret_key, metric):
-        """ Specify Amazon CloudWatch params """
+
+    # PutMetricData accepts at most this many metrics per request.
+    max_metrics_per_request = 20
+
+    def __init__(self, key, secret_key, metrics, base_url="monitoring.ap-northeast-1.amazonaws.com",
+                 metadata_host="169.254.169.254", timeout=10):
+        """ Specify Amazon CloudWatch params. metrics is a list of metrics, or
+            a single one. timeout is in seconds, for each request. """
         
-        self.base_url = "monitoring.ap-northeast-1.amazonaws.com"
+        self.base_url = base_url
+        self.timeout = timeout
+        self.metadata_host = metadata_host
         self.key = key
         self.secret_key = secret_key
-        self.metric = metric
+        if isinstance(metrics, MetricObject):
+            metrics = [metrics]
+        self.metrics = metrics
+        self.conn = None
 
-    def get_instance_id(self, instance_id = None):
-        """ get instance id from amazon meta data server """
+    def get_instance_id(self, instance_id = None, cache_file = None):
+        """ get instance id from amazon meta data server. If cache_file is
+            given, the id is read from there when a previous run saved it """
 
         self.instance_id = instance_id
 
+        if self.instance_id is None and cache_file is not None:
+            try:
+                f = open(cache_file)
+                try:
+                    self.instance_id = f.read().strip() or None
+                finally:
+                    f.close()
+            except IOError:
+                pass
+
         if self.instance_id is None: 
             try:
-                conn = HTTPConnection("169.254.169.254")
+                conn = HTTPConnection(self.metadata_host, timeout=5)
                 conn.request("GET", "/latest/meta-data/instance-id")
+                res = conn.getresponse()
+                body = res.read()
+                conn.close()
             except Exception:
                 raise CloudWatchException("Can't connect Amazon meta data server to get InstanceID : (%s)")
 
-            self.instance_id = conn.getresponse().read()
+            # Don't cache an error page as the InstanceID.
+            if res.status != 200 or not body.strip():
+                raise CloudWatchException("Amazon meta data server returned %s %s instead of an InstanceID" % (res.status, res.reason))
+            self.instance_id = body.strip()
+
+            if cache_file is not None:
+                try:
+                    f = open(cache_file, 'w')
+                    try:
+                        f.write(self.instance_id)
+                    finally:
+                        f.close()
+                except IOError:
+                    pass
         
         return self
 
-    def set_params(self):
+    def set_params(self, metrics=None):
+        """ Build the PutMetricData parameters for metrics, by default the
+            first max_metrics_per_request of them """
+
+        if metrics is None:
+            metrics = self.metrics[:self.max_metrics_per_request]
 
-        params = {'Namespace': 'logster',
-       'MetricData.member.1.MetricName': self.metric.name,
-       'MetricData.member.1.Value': self.metric.value,
-       'MetricData.member.1.Unit': self.metric.units,
-       'MetricData.member.1.Dimensions.member.1.Name': 'InstanceID',
-       'MetricData.member.1.Dimensions.member.1.Value': self.instance_id}       
+        params = {'Namespace': 'logster'}
+        for number, metric in enumerate(metrics):
+            member = 'MetricData.member.%d.' % (number + 1)
+            params[member + 'MetricName'] = metric.name
+            params[member + 'Value'] = metric.value
+            params[member + 'Unit'] = metric.units
+            params[member + 'Dimensions.member.1.Name'] = 'InstanceID'
+            params[member + 'Dimensions.member.1.Value'] = self.instance_id
      
         self.url_params = params
         self.url_params['AWSAccessKeyId'] = self.key
@@ -115,7 +560,7 @@ class CloudWatch:
         self.url_params['SignatureMethod'] = 'HmacSHA256'
         self.url_params['SignatureVersion'] = '2'
         self.url_params['Version'] = '2010-08-01'
-        self.url_params['Timestamp'] = self.metric.timestamp
+        self.url_params['Timestamp'] = metrics[0].timestamp
 
         return self
     
@@ -141,13 +586,226 @@ class CloudWatch:
 
         return "/?" + url_string
  
-    def put_data(self):
-        signedURL = self.set_params().get_signed_url()
+    def put_data(self, metrics=None):
+        """ Send metrics, by default the ones given to the constructor, in
+            batches of max_metrics_per_request over one keep-alive connection """
+        if metrics is None:
+            metrics = self.metrics
+
+        for i in range(0, len(metrics), self.max_metrics_per_request):
+            signedURL = self.set_params(metrics[i:i + self.max_metrics_per_request]).get_signed_url()
+            res, body = self.request(signedURL)
+            if res.status != 200:
+                raise CloudWatchException("Amazon CloudWatch returned %s %s: %s" % (res.status, res.reason, body))
+
+    def request(self, url):
+        """ GET url over the kept connection, reconnecting once if the server
+            has closed it since the last request """
+        for attempt in (1, 2):
+            reused = self.conn is not None
+            try:
+                if self.conn is None:
+                    self.conn = HTTPConnection(self.base_url, timeout=self.timeout)
+                self.conn.request("GET", url)
+                res = self.conn.getresponse()
+                return res, res.read()
+            except Exception:
+                self.close()
+                if not reused:
+                    raise CloudWatchException("Can't connect Amazon CloudWatch server") 
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Gmetric(object):
+    """ Sends metrics straight to gmond in the Ganglia 3.1+ XDR wire format,
+        as the gmetric program does, without running it. Metadata packets
+        are only resent every metadata_interval seconds per metric. """
+
+    slopes = {'zero': 0, 'positive': 1, 'negative': 2, 'both': 3, 'unspecified': 4}
+
+    def __init__(self, channels, tmax=60, dmax=0, group=None, spoof=None, metadata_interval=60):
+        """ channels is a list of (host, port, ttl) tuples, as returned by
+            read_gmond_channels(). """
+        self.channels = channels
+        self.tmax = tmax
+        self.dmax = dmax
+        self.group = group
+        self.spoof = spoof
+        self.metadata_interval = metadata_interval
+        self.metadata_sent = {}
+        if spoof:
+            self.host = spoof
+        else:
+            self.host = socket.gethostname()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def metadata_packet(self, name, metric_type, metric):
+        """ Build the gmetadata_full packet describing a metric. """
+        extra_data = []
+        if self.group:
+            extra_data.append(('GROUP', self.group))
+        if metric.title:
+            extra_data.append(('TITLE', metric.title))
+        if metric.desc:
+            extra_data.append(('DESC', metric.desc))
+        if self.spoof:
+            extra_data.append(('SPOOF_HOST', self.spoof))
+
+        packet = [xdr_uint(128), xdr_string(self.host), xdr_string(name), xdr_uint(bool(self.spoof)),
+                  xdr_string(metric_type), xdr_string(name), xdr_string(metric.units),
+                  xdr_uint(self.slopes.get(metric.slope, self.slopes['both'])),
+                  xdr_uint(self.tmax), xdr_uint(self.dmax), xdr_uint(len(extra_data))]
+        for key, value in extra_data:
+            packet.append(xdr_string(key))
+            packet.append(xdr_string(value))
+        return b''.join(packet)
+
+    def value_packet(self, name, metric):
+        """ Build the gmetric_string packet carrying a metric's value. """
+        return b''.join([xdr_uint(133), xdr_string(self.host), xdr_string(name), xdr_uint(bool(self.spoof)),
+                         xdr_string('%s'), xdr_string(str(metric.value))])
+
+    def send(self, name, metric_type, metric):
+        """ Send a metric under the given name and Ganglia type to every
+            channel. """
+        packets = []
+        now = time()
+        if now - self.metadata_sent.get(name, 0) >= self.metadata_interval:
+            packets.append(self.metadata_packet(name, metric_type, metric))
+            self.metadata_sent[name] = now
+        packets.append(self.value_packet(name, metric))
+
+        for host, port, ttl in self.channels:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            for packet in packets:
+                self.sock.sendto(packet, (host, port))
+
+    def close(self):
+        self.sock.close()
+
+
+def xdr_uint(value):
+    return struct.pack('>I', value)
+
+
+def xdr_string(value):
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return struct.pack('>I', len(value)) + value + b'\0' * (-len(value) % 4)
+
+
+def read_gmond_channels(conf_file):
+    """ Return the (host, port, ttl) of each udp_send_channel in a gmond.conf,
+        using mcast_join as the host for multicast channels. """
+    f = open(conf_file)
+    try:
+        conf = f.read()
+    finally:
+        f.close()
+    conf = re.compile(r'/\*.*?\*/', re.DOTALL).sub('', conf)
+    conf = re.sub(r'(#|//).*', '', conf)
+
+    channels = []
+    for block in re.findall(r'udp_send_channel\s*\{([^}]*)\}', conf):
+        settings = dict(re.findall(r'(\w+)\s*=\s*"?([^"\s]+)"?', block))
+        host = settings.get('mcast_join', settings.get('host'))
+        if host:
+            channels.append((host, int(settings.get('port', 8649)), int(settings.get('ttl', 1))))
+    return channels
+
+
+def parse_gmetric_options(gmetric_options):
+    """ Pick the config file, tmax, dmax, group and spoof settings out of a
+        gmetric command line. Other gmetric options are ignored. """
+    settings = {'conf': '/etc/ganglia/gmond.conf', 'tmax': 60, 'dmax': 0, 'group': None, 'spoof': None}
+    flags = {'-c': 'conf', '--conf': 'conf', '-x': 'tmax', '--tmax': 'tmax',
+             '-d': 'dmax', '--dmax': 'dmax', '-g': 'group', '--group': 'group',
+             '-S': 'spoof', '--spoof': 'spoof'}
+
+    args = shlex.split(gmetric_options or '')
+    while args:
+        arg = args.pop(0)
+        if '=' in arg and arg.startswith('--'):
+            arg, value = arg.split('=', 1)
+            args.insert(0, value)
+        if arg in flags and args:
+            settings[flags[arg]] = args.pop(0)
+
+    settings['tmax'] = int(settings['tmax'])
+    settings['dmax'] = int(settings['dmax'])
+    return settings
+
+
+class NSCAException(Exception):
+    """ Raise this exception if check results can't be sent to NSCA """
+    pass
+
+class NSCA(object):
+    """ Minimal NSCA client, speaking the protocol send_nsca uses so that all
+        check results of a run go over a single connection. Only the 'none'
+        and 'xor' encryption methods are supported. The server only accepts
+        packets with a plugin output of the size it was built with,
+        output_length: 4096 bytes for NSCA 2.9, 512 for 2.7 and older. """
+
+    encryption_methods = {'none': 0, 'xor': 1}
+    iv_size = 128
+
+    def __init__(self, host, port, password='', encryption='none', timeout=10, output_length=4096):
+        if encryption not in self.encryption_methods:
+            raise NSCAException("Unsupported NSCA encryption method: %s" % encryption)
+        self.host = host
+        self.port = port
+        self.password = password
+        self.encryption = encryption
+        self.timeout = timeout
+        # int16 version, crc32, timestamp, int16 return code, host name,
+        # service description and plugin output, padded as the C struct is
+        # to a multiple of 4 bytes.
+        self.packet_format = '!hxxIIh64s128s%ss' % output_length + 'x' * (-(206 + output_length) % 4)
+
+    def packet(self, timestamp, host_name, service, return_code, output):
+        """ Build a data packet, with its CRC, before encryption. """
+        fields = [3, 0, timestamp, return_code, host_name, service, output]
+        for i in (4, 5, 6):
+            if not isinstance(fields[i], bytes):
+                fields[i] = fields[i].encode('utf-8')
+        packet = struct.pack(self.packet_format, *fields)
+        fields[1] = zlib.crc32(packet) & 0xffffffff
+        return struct.pack(self.packet_format, *fields)
+
+    def encrypt(self, packet, iv):
+        if self.encryption == 'none':
+            return packet
+        packet = bytearray(packet)
+        iv = bytearray(iv)
+        password = bytearray(self.password.encode('utf-8'))
+        for i in range(len(packet)):
+            packet[i] ^= iv[i % len(iv)]
+            if password:
+                packet[i] ^= password[i % len(password)]
+        return bytes(packet)
+
+    def send(self, checks):
+        """ Send (host_name, service, return_code, output) check results. """
         try:
-            conn = HTTPConnection(self.base_url)
-            conn.request("GET", signedURL)
-        except Exception:
-            raise CloudWatchException("Can't connect Amazon CloudWatch server") 
-        res = conn.getresponse()
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+        except socket.error as e:
+            raise NSCAException("Can't connect to NSCA at %s:%s: %s" % (self.host, self.port, e))
 
+        try:
+            init = b''
+            while len(init) < self.iv_size + 4:
+                data = sock.recv(self.iv_size + 4 - len(init))
+                if not data:
+                    raise NSCAException("NSCA at %s:%s closed the connection" % (self.host, self.port))
+                init += data
+            iv = init[:self.iv_size]
+            timestamp = struct.unpack('!I', init[self.iv_size:])[0]
 
+            sock.sendall(b''.join(self.encrypt(self.packet(timestamp, *check), iv) for check in checks))
+        finally:
+            sock.close()
@@ -27,6 +27,9 @@ class ErrorLogLogster(LogsterParser):
         # fields from the line
         self.reg = re.compile('^\[[^]]+\] \[(?P<loglevel>\w+)\] .*')
 
+        # The same match applied to every line of a block at once.
+        self.block_reg = re.compile('^\[[^]\n]+\] \[(\w+)\] ', re.MULTILINE)
+
 
     def parse_line(self, line):
         '''This function should digest the contents of one line at a time, updating
@@ -52,12 +55,40 @@ class ErrorLogLogster(LogsterParser):
                     self.other += 1
 
             else:
-                raise LogsterParsingException, "regmatch failed to match"
+                return self.SKIPPED
 
         except Exception, e:
             raise LogsterParsingException, "regmatch or contents failed with %s" % e
 
 
+    def parse_lines(self, lines):
+        '''Tally the log levels of a whole block of lines in one scan.'''
+        if not isinstance(lines, basestring):
+            lines = ''.join(lines)
+
+        levels = self.block_reg.findall(lines)
+        notice = levels.count('notice')
+        warn = levels.count('warn')
+        error = levels.count('error')
+        crit = levels.count('crit')
+
+        self.notice += notice
+        self.warn += warn
+        self.error += error
+        self.crit += crit
+        self.other += len(levels) - notice - warn - error - crit
+        self.count_skipped(lines, len(levels))
+
+
+    def merge(self, other):
+        '''Add the counts of another instance that parsed a later part of the log.'''
+        self.notice += other.notice
+        self.warn += other.warn
+        self.error += other.error
+        self.crit += other.crit
+        self.other += other.other
+
+
     def get_state(self, duration):
         '''Run any necessary calculations on the data collected from the logs
         and return a list of metric objects.'''
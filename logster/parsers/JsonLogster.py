@@ -5,12 +5,119 @@
 ###  For example:
 ###  sudo ./logster --dry-run --output=ganglia --parser-options '--key-separator _' JsonLogster /var/cache/stats.log.json
 ###
-import json
+###  Lines are decoded with ujson when it is installed, which is several
+###  times faster than the standard json module.
+###
+###  The metric name of every key path is cached, so a steady schema only
+###  runs key_filter once per path.  See --key-cache-size.
+###
+###  To keep only some metrics of wide objects, list their names with --keys
+###  and/or shell style patterns with --key-glob.  Parts of the object that
+###  cannot lead to a wanted metric are not walked at all:
+###  sudo ./logster --dry-run --output=stdout --parser-options '--keys requests.total,requests.errors --key-glob latency.*.p99' JsonLogster /var/cache/stats.log.json
+###
+###  By default the last value of each metric in the log is reported.  With
+###  --aggregate, the metrics matching a pattern are aggregated over all lines
+###  instead, with one of last, sum, min, max, mean, count (of lines having the
+###  key) or rate (sum per second).  The first matching pattern wins:
+###  sudo ./logster --dry-run --output=stdout --parser-options '--aggregate requests.*=rate,latency.*=max' JsonLogster /var/log/app/stats.json
+###
+import fnmatch
+import logging
 import optparse
+import re
+
+try:
+    import ujson as json
+except ImportError:
+    import json
 
 from logster.logster_helper import MetricObject, LogsterParser
 from logster.logster_helper import LogsterParsingException
 
+logger = logging.getLogger('logster')
+
+aggregation_modes = ('last', 'sum', 'min', 'max', 'mean', 'count', 'rate')
+
+class KeyPathCache(object):
+    '''
+    Maps key paths to what flatten_object makes of them.
+    Recently used paths are kept in two generations: once
+    the newer one holds half of size paths, the older one
+    is dropped and the newer one takes its place.  A path
+    found in the older generation moves to the newer one,
+    so paths still in use survive, as in an LRU cache,
+    without bookkeeping on every hit.
+    '''
+
+    def __init__(self, size):
+        self.generation_size = max(size // 2, 1)
+        self.recent = {}
+        self.older = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.recent) + len(self.older)
+
+    def get(self, path):
+        '''Return the entry cached for path, or None.'''
+        entry = self.recent.get(path)
+        if entry is None:
+            entry = self.older.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.put(path, entry)
+        self.hits += 1
+        return entry
+
+    def put(self, path, entry):
+        if len(self.recent) >= self.generation_size:
+            self.older = self.recent
+            self.recent = {}
+        self.recent[path] = entry
+
+class KeySelector(object):
+    '''
+    Decides which metric names, and which key prefixes
+    leading to them, are wanted.  Exact names are kept
+    with every prefix along their path, so both checks
+    are a set lookup.  A glob can only match below the
+    literal text before its first wildcard.
+    '''
+
+    def __init__(self, keys, globs, separator):
+        self.keys = set(keys)
+        self.prefixes = set()
+        for key in keys:
+            parts = key.split(separator)
+            for length in range(1, len(parts)):
+                self.prefixes.add(separator.join(parts[:length]) + separator)
+
+        self.globs = []
+        for glob in globs:
+            literal = re.match('[^*?[]*', glob).group(0)
+            self.globs.append((literal, re.compile(fnmatch.translate(glob))))
+
+    def wants(self, name):
+        '''Whether name is a wanted metric name.'''
+        if name in self.keys:
+            return True
+        for literal, regex in self.globs:
+            if regex.match(name):
+                return True
+        return False
+
+    def wants_prefix(self, prefix):
+        '''Whether a wanted metric name can start with prefix.'''
+        if prefix in self.prefixes:
+            return True
+        for literal, regex in self.globs:
+            if prefix.startswith(literal) or literal.startswith(prefix):
+                return True
+        return False
+
 class JsonLogster(LogsterParser):
     '''
     JsonLogster parses a file of JsonObjects, each on their own line.
@@ -18,8 +125,14 @@ class JsonLogster(LogsterParser):
     be keyed by a concatenated key made up of all parent keys.
     You can subclass this class and implement the key_filter method
     to skip or transform specific keys in the object hierarchy.
+    If your key_filter always returns the same result for the same
+    key, set cacheable_key_filter to True so its results are cached.
     '''
 
+    # Whether key_filter only depends on the key it is given.  The
+    # default one does; overrides have to say so to be cached.
+    cacheable_key_filter = False
+
     def __init__(self, option_string=None):
         '''Initialize any data structures or variables needed for keeping track
         of the tasty bits we find in the log we are parsing.'''
@@ -33,6 +146,14 @@ class JsonLogster(LogsterParser):
         optparser = optparse.OptionParser()
         optparser.add_option('--key-separator', '-k', dest='key_separator', default='.',
         help='Key separator for flattened json object key name. Default: \'.\'  \'/\' and \':\' are not allowed.''')
+        optparser.add_option('--key-cache-size', dest='key_cache_size', type='int', default=10000,
+        help='Number of key paths to remember the metric names of, 0 to disable. Default: 10000')
+        optparser.add_option('--keys', dest='keys', default='',
+        help='Comma-separated list of metric names to keep.  Default: keep all')
+        optparser.add_option('--key-glob', dest='key_globs', default='',
+        help='Comma-separated list of shell style patterns of metric names to keep.  Default: keep all')
+        optparser.add_option('--aggregate', dest='aggregate', default='',
+        help='Comma-separated list of pattern=mode, where mode is one of %s, to aggregate the values of metrics matching the shell style pattern over all lines.  Default: last' % ', '.join(aggregation_modes))
 
         opts, args = optparser.parse_args(args=options)
         self.key_separator = opts.key_separator
@@ -40,6 +161,29 @@ class JsonLogster(LogsterParser):
         if self.key_separator == '/' or self.key_separator == ':':
             raise RuntimeError('Cannot use : or / as key_separator.')
 
+        # (regex, mode) of each --aggregate pattern, and the mode and
+        # running [value, count] of each metric being aggregated.
+        self.aggregations = []
+        for aggregation in [aggregation for aggregation in opts.aggregate.split(',') if aggregation]:
+            glob, separator, mode = aggregation.rpartition('=')
+            if not separator or mode not in aggregation_modes:
+                raise RuntimeError('Aggregations must be pattern=mode, with mode one of %s.' % ', '.join(aggregation_modes))
+            self.aggregations.append((re.compile(fnmatch.translate(glob)), mode))
+        self.aggregate_modes = {}
+        self.aggregates = {}
+        self.line_metrics = {}
+
+        self.key_selector = None
+        if opts.keys or opts.key_globs:
+            self.key_selector = KeySelector([key for key in opts.keys.split(',') if key],
+                                            [glob for glob in opts.key_globs.split(',') if glob],
+                                            self.key_separator)
+
+        self.key_cache = None
+        key_filter = getattr(type(self).key_filter, 'im_func', type(self).key_filter)
+        if opts.key_cache_size > 0 and (self.cacheable_key_filter or key_filter is JsonLogster.key_filter.im_func):
+            self.key_cache = KeyPathCache(opts.key_cache_size)
+
     def key_filter(self, key):
         '''
         Default key_filter method.  Override and implement
@@ -82,66 +226,202 @@ class JsonLogster(LogsterParser):
 
         return metric_type
 
-    def flatten_object(self, node, separator='.', key_filter_callback=None, parent_keys=[]):
+    def flatten_object(self, node, separator='.', key_filter_callback=None, parent_keys=[], flattened=None, key_cache=None, key_selector=None):
         '''
-        Recurses through dicts and/or lists and flattens them
+        Walks through dicts and/or lists and flattens them
         into a single level dict of key: value pairs.  Each
-        key consists of all of the recursed keys joined by
+        key consists of all of the parent keys joined by
         separator.  If key_filter_callback is callable,
         it will be called with each key.  It should return
         either a new key which will be used in the final full
         key string, or False, which will indicate that this
-        key and its value should be skipped.
+        key and its value should be skipped.  If flattened
+        is given, the pairs are added to that dict, which
+        is returned, instead of to a new one.  If key_cache
+        is given, the names worked out for each key path are
+        looked up in and added to it.  It must only be shared
+        between calls with the same separator, callback and
+        key_selector.  If key_selector is given, only the keys
+        it wants are kept, and containers it has no use for
+        are skipped without being walked.
         '''
-        flattened = {}
+        if flattened is None:
+            flattened = {}
+        if not callable(key_filter_callback):
+            key_filter_callback = None
 
-        try:
-            iterator = node.iteritems()
-        except AttributeError:
-            iterator = enumerate(node)
-
-        for key, child in iterator:
-            # If key_filter_callback was provided,
-            # then call it on the key.  If the returned
-            # key is false, then, we know to skip it.
-            if callable(key_filter_callback):
-                key = key_filter_callback(key)
-            if key is False:
-                continue
+        prefix = ''.join([str(key) + separator for key in parent_keys])
 
-            # append this key to the end of all keys seen so far
-            all_keys = parent_keys + [str(key)]
+        # Rather than recursing, keep a stack of the prefix and
+        # remaining items of every container being walked.  Each
+        # child container is walked before the next sibling, in
+        # the same order a recursive walk would visit them.
+        stack = [(prefix, self.iterate_items(node))]
+        while stack:
+            prefix, iterator = stack[-1]
+            for key, child in iterator:
+                # The entry for a key path is the prefix of its
+                # children and the metric name it gets as a leaf,
+                # either None if unwanted, or False if the key
+                # is to be skipped altogether.
+                entry = None
+                if key_cache is not None:
+                    path = (prefix, key)
+                    entry = key_cache.get(path)
+                if entry is None:
+                    # If key_filter_callback was provided,
+                    # then call it on the key.  If the returned
+                    # key is false, then, we know to skip it.
+                    if key_filter_callback is not None:
+                        key = key_filter_callback(key)
+                    if key is False:
+                        entry = False
+                    else:
+                        # '/' is  not allowed in key names.
+                        # Ganglia writes files based on key names
+                        # and doesn't escape these in the path.
+                        name = prefix + str(key)
+                        metric_name = name.replace('/', self.key_separator)
+                        entry = (name + separator, metric_name)
+                        if key_selector is not None:
+                            entry = (key_selector.wants_prefix(metric_name + separator) and entry[0] or None,
+                                     key_selector.wants(metric_name) and metric_name or None)
+                    if key_cache is not None:
+                        key_cache.put(path, entry)
+                if entry is False:
+                    continue
 
-            if hasattr(child, '__iter__'):
-                # merge the child items all together
-                flattened.update(self.flatten_object(child, separator, key_filter_callback, all_keys))
+                if hasattr(child, '__iter__'):
+                    if entry[0] is not None:
+                        stack.append((entry[0], self.iterate_items(child)))
+                        break
+                elif entry[1] is not None:
+                    flattened[entry[1]] = child
             else:
-                # '/' is  not allowed in key names.
-                # Ganglia writes files based on key names
-                # and doesn't escape these in the path.
-                final_key = separator.join(all_keys).replace('/', self.key_separator)
-                flattened[final_key] = child
+                stack.pop()
 
         return flattened
 
+    def iterate_items(self, node):
+        '''Return an iterator of the key, child pairs of a dict or list.'''
+        try:
+            return node.iteritems()
+        except AttributeError:
+            return enumerate(node)
+
     def parse_line(self, line):
         '''This function should digest the contents of one line at a time, updating
         object's state variables. Takes a single argument, the line to be parsed.'''
 
-        json_data = json.loads(line)
-        # Using update() in order to work with multiple lines.
-        # Since lines are parsed in order as they appear in the file,
-        # if there are multiple entries for the same key, this will
-        # end up using the latest value for that key.
-        self.metrics.update(self.flatten_object(json.loads(line), self.key_separator, self.key_filter))
+        self.line_metrics.clear()
+        self.flatten_object(json.loads(line), self.key_separator, self.key_filter,
+                            flattened=self.line_metrics, key_cache=self.key_cache,
+                            key_selector=self.key_selector)
+        # A line with none of the keys kept is of no interest.
+        if not self.line_metrics:
+            return self.SKIPPED
+
+        if not self.aggregations:
+            # Since lines are parsed in order as they appear in the file,
+            # if there are multiple entries for the same key, this will
+            # end up using the latest value for that key.
+            self.metrics.update(self.line_metrics)
+            return
+
+        for metric_name, metric_value in self.line_metrics.iteritems():
+            self.aggregate(metric_name, metric_value)
+
+    def aggregation_mode(self, metric_name):
+        '''Return the aggregation mode of metric_name, 'last' if no pattern matches.'''
+        mode = self.aggregate_modes.get(metric_name)
+        if mode is None:
+            mode = 'last'
+            for regex, aggregation_mode in self.aggregations:
+                if regex.match(metric_name):
+                    mode = aggregation_mode
+                    break
+            self.aggregate_modes[metric_name] = mode
+        return mode
+
+    def aggregate(self, metric_name, metric_value):
+        '''
+        Add one value of a metric to its running aggregate, which
+        is a [value, count] pair whatever the mode.  Values that are
+        not numbers can only be counted; in other modes they are kept
+        as the last value, which is only reported if the metric never
+        had a number.
+        '''
+        mode = self.aggregation_mode(metric_name)
+        if mode == 'last':
+            self.metrics[metric_name] = metric_value
+            return
+        if mode != 'count' and self.infer_metric_type(metric_value) == 'string':
+            self.metrics[metric_name] = metric_value
+            return
+
+        aggregate = self.aggregates.get(metric_name)
+        if aggregate is None:
+            self.aggregates[metric_name] = [metric_value, 1]
+            return
+
+        aggregate[1] += 1
+        if mode == 'sum' or mode == 'mean' or mode == 'rate':
+            aggregate[0] += metric_value
+        elif mode == 'min':
+            if metric_value < aggregate[0]:
+                aggregate[0] = metric_value
+        elif mode == 'max':
+            if metric_value > aggregate[0]:
+                aggregate[0] = metric_value
+
+    def merge(self, other):
+        '''
+        Combine the metrics of another instance that parsed
+        a later part of the log.  As in parse_line, the
+        latest value for each key wins.
+        '''
+        self.metrics.update(other.metrics)
+        for metric_name, (metric_value, count) in other.aggregates.items():
+            aggregate = self.aggregates.get(metric_name)
+            if aggregate is None:
+                self.aggregates[metric_name] = [metric_value, count]
+                continue
+            mode = self.aggregation_mode(metric_name)
+            aggregate[1] += count
+            if mode == 'sum' or mode == 'mean' or mode == 'rate':
+                aggregate[0] += metric_value
+            elif mode == 'min':
+                aggregate[0] = min(aggregate[0], metric_value)
+            elif mode == 'max':
+                aggregate[0] = max(aggregate[0], metric_value)
+        if self.key_cache is not None and other.key_cache is not None:
+            self.key_cache.hits += other.key_cache.hits
+            self.key_cache.misses += other.key_cache.misses
 
     def get_state(self, duration):
         '''Run any necessary calculations on the data collected from the logs
         and return a list of metric objects.'''
         self.duration = duration
 
+        if self.key_cache is not None:
+            logger.debug('JsonLogster key cache: %d hits, %d misses, %d key paths cached' %
+                         (self.key_cache.hits, self.key_cache.misses, len(self.key_cache)))
+
         metric_objects = []
         for metric_name, metric_value in self.metrics.items():
+            if metric_name not in self.aggregates:
+                metric_objects.append(self.get_metric_object(metric_name, metric_value))
+
+        for metric_name, (metric_value, count) in self.aggregates.items():
+            mode = self.aggregation_mode(metric_name)
+            if mode == 'count':
+                metric_value = count
+            elif mode == 'mean':
+                metric_value = float(metric_value) / count
+            elif mode == 'rate':
+                if duration <= 0:
+                    continue
+                metric_value = float(metric_value) / duration
             metric_objects.append(self.get_metric_object(metric_name, metric_value))
 
         return metric_objects
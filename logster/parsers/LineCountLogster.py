@@ -45,6 +45,12 @@ class LineCountLogster(LogsterParser):
 
         if (self.regex == None or self.regex.match(line)):
             self.line_count += 1
+        else:
+            return self.SKIPPED
+
+    def merge(self, other):
+        '''Add the count of another instance that parsed a later part of the log.'''
+        self.line_count += other.line_count
 
     def get_state(self, duration):
         '''Run any necessary calculations on the data collected from the logs
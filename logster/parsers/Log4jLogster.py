@@ -59,6 +59,9 @@ class Log4jLogster(LogsterParser):
         # fields from the line (in this case, a log level such as WARN, ERROR, or FATAL).
         self.reg = re.compile('[0-9-_:\.]+ (?P<log_level>%s)' % ('|'.join(self.levels)) )
         
+        # The same match applied to every line of a block at once.
+        self.block_reg = re.compile('^[0-9-_:\.]+ (%s)' % ('|'.join(self.levels)), re.MULTILINE)
+        
         
     def parse_line(self, line):
         '''This function should digest the contents of one line at a time, updating
@@ -77,12 +80,29 @@ class Log4jLogster(LogsterParser):
                     setattr(self, log_level, current_val+1)
                     
             else:
-                raise LogsterParsingException, "regmatch failed to match"
+                return self.SKIPPED
                 
         except Exception, e:
             raise LogsterParsingException, "regmatch or contents failed with %s" % e
             
             
+    def parse_lines(self, lines):
+        '''Tally the log levels of a whole block of lines in one scan.'''
+        if not isinstance(lines, basestring):
+            lines = ''.join(lines)
+            
+        log_levels = self.block_reg.findall(lines)
+        self.count_skipped(lines, len(log_levels))
+        for level in self.levels:
+            setattr(self, level, getattr(self, level) + log_levels.count(level))
+            
+            
+    def merge(self, other):
+        '''Add the counts of another instance that parsed a later part of the log.'''
+        for level in self.levels:
+            setattr(self, level, getattr(self, level) + getattr(other, level))
+            
+            
     def get_state(self, duration):
         '''Run any necessary calculations on the data collected from the logs
         and return a list of metric objects.'''
@@ -30,6 +30,14 @@
 ###  For example:
 ###  sudo ./logster --output=stdout MetricLogster /var/log/example_app/app.log --parser-options '--percentiles 25,75,90'
 ###
+###  By default every time value is kept so percentiles are exact. For busy timers use
+###  --quantile-engine ddsketch, which keeps a bounded sketch instead and returns
+###  percentiles within --relative-accuracy (default 1%) of the exact value:
+###  sudo ./logster --output=stdout MetricLogster /var/log/example_app/app.log --parser-options '--quantile-engine ddsketch --relative-accuracy 0.005'
+###
+###  Alternatively --max-samples N keeps exact percentiles while a timer has up to N values
+###  and a uniform random sample of N values after that; the mean stays exact.
+###
 ###  Based on SampleLogster which is Copyright 2011, Etsy, Inc.
 
 import re
@@ -40,6 +48,22 @@ from logster.parsers import stats_helper
 from logster.logster_helper import MetricObject, LogsterParser
 from logster.logster_helper import LogsterParsingException
 
+class Timer(object):
+    '''The unit and values seen for one METRIC_TIME metric.'''
+
+    __slots__ = ('name', 'unit', 'values')
+
+    def __init__(self, name, unit, values):
+        self.name = name
+        self.unit = unit
+        self.values = values
+
+    def __getstate__(self):
+        return (self.name, self.unit, self.values)
+
+    def __setstate__(self, state):
+        self.name, self.unit, self.values = state
+
 class MetricLogster(LogsterParser):
 
     def __init__(self, option_string=None):
@@ -57,35 +81,64 @@ class MetricLogster(LogsterParser):
         optparser = optparse.OptionParser()
         optparser.add_option('--percentiles', '-p', dest='percentiles', default='90',
                             help='Comma-separated list of integer percentiles to track: (default: "90")')
+        optparser.add_option('--quantile-engine', dest='quantile_engine', default='exact',
+                            choices=sorted(stats_helper.quantile_engines.keys()),
+                            help='How to compute percentiles, "exact" keeps every value, "ddsketch" uses bounded memory: (default: "exact")')
+        optparser.add_option('--relative-accuracy', dest='relative_accuracy', type='float', default=0.01,
+                            help='Relative error allowed on percentiles with --quantile-engine ddsketch: (default: 0.01)')
+        optparser.add_option('--max-samples', dest='max_samples', type='int', default=None,
+                            help='Keep a random sample of at most this many values per timer with --quantile-engine exact: (default: keep all)')
 
         opts, args = optparser.parse_args(args=options)
 
         self.percentiles = opts.percentiles.split(',')
+        self.quantile_engine = opts.quantile_engine
+        self.relative_accuracy = opts.relative_accuracy
+        self.max_samples = opts.max_samples
 
-        # General regular expressions, expecting the metric name to be included in the log file.
+        # One regular expression for both kinds of metric line, expecting the metric
+        # name to be included in the log file. Only the group of the kind found is set.
 
-        self.count_reg = re.compile('.*METRIC_COUNT\smetric=(?P<count_name>[^\s]+)\s+value=(?P<count_value>[0-9.]+)[^0-9.].*')
-        self.time_reg = re.compile('.*METRIC_TIME\smetric=(?P<time_name>[^\s]+)\s+value=(?P<time_value>[0-9.]+)\s*(?P<time_unit>[^\s$]*).*')
+        self.metric_reg = re.compile('METRIC_(?:'
+                                     'COUNT\smetric=(?P<count_name>[^\s]+)\s+value=(?P<count_value>[0-9.]+)[^0-9.]|'
+                                     'TIME\smetric=(?P<time_name>[^\s]+)\s+value=(?P<time_value>[0-9.]+)\s*(?P<time_unit>[^\s$]*))')
 
     def parse_line(self, line):
         '''This function should digest the contents of one line at a time, updating
         object's state variables. Takes a single argument, the line to be parsed.'''
 
-        count_match = self.count_reg.match(line)
-        if count_match:
-            countbits = count_match.groupdict()
-            count_name = countbits['count_name']
-            if not self.counts.has_key(count_name):
-                self.counts[count_name] = 0.0
-            self.counts[count_name] += float(countbits['count_value']);
-
-        time_match = self.time_reg.match(line)
-        if time_match:
-            time_name = time_match.groupdict()['time_name']
+        # Most lines of an application log are not metrics, skip them cheaply.
+        if 'METRIC_' not in line:
+            return self.SKIPPED
+
+        match = self.metric_reg.search(line)
+        if not match:
+            return self.SKIPPED
+
+        count_name, count_value, time_name, time_value, time_unit = match.groups()
+        if count_name is not None:
+            self.counts[count_name] = self.counts.get(count_name, 0.0) + float(count_value)
+        else:
+            timer = self.times.get(time_name)
+            if timer is None:
+                timer = self.times[time_name] = Timer(time_name, time_unit, self.new_quantiles())
+            timer.values.add(float(time_value))
+
+    def new_quantiles(self):
+        '''Return an empty store for the values of one timer.'''
+        if self.quantile_engine == 'ddsketch':
+            return stats_helper.DDSketch(self.relative_accuracy)
+        return stats_helper.ExactQuantiles(self.max_samples)
+
+    def merge(self, other):
+        '''Combine the counters and timer values of another instance that
+        parsed a later part of the log.'''
+        for count_name, count in other.counts.items():
+            self.counts[count_name] = self.counts.get(count_name, 0.0) + count
+        for time_name, timer in other.times.items():
             if not self.times.has_key(time_name):
-                unit = time_match.groupdict()['time_unit']
-                self.times[time_name] = {'unit': unit, 'values': []};
-            self.times[time_name]['values'].append(float(time_match.groupdict()['time_value']))
+                self.times[time_name] = Timer(time_name, timer.unit, self.new_quantiles())
+            self.times[time_name].values.merge(timer.values)
 
     def get_state(self, duration):
         '''Run any necessary calculations on the data collected from the logs
@@ -93,11 +146,10 @@ class MetricLogster(LogsterParser):
         metrics = []
         if duration > 0:
             metrics += [MetricObject(counter, self.counts[counter]/duration) for counter in self.counts]
-        for time_name in self.times:
-            values = self.times[time_name]['values']
-            unit = self.times[time_name]['unit']
-            metrics.append(MetricObject(time_name+'.mean', stats_helper.find_mean(values), unit))
-            metrics.append(MetricObject(time_name+'.median', stats_helper.find_median(values), unit))
-            metrics += [MetricObject('%s.%sth_percentile' % (time_name,percentile), stats_helper.find_percentile(values,int(percentile)), unit) for percentile in self.percentiles]
+        for timer in self.times.values():
+            summary = timer.values.summarize([int(percentile) for percentile in self.percentiles])
+            metrics.append(MetricObject(timer.name+'.mean', summary['mean'], timer.unit))
+            metrics.append(MetricObject(timer.name+'.median', summary['median'], timer.unit))
+            metrics += [MetricObject('%s.%sth_percentile' % (timer.name,percentile), summary['percentiles'][int(percentile)], timer.unit) for percentile in self.percentiles]
 
         return metrics
@@ -37,16 +37,18 @@ class PostfixLogster(LogsterParser):
         self.numRbl = 0
         
         # Regular expression for matching lines we are interested in, and capturing
-        # fields from the line (in this case, http_status_code).
-        self.reg = re.compile('.*delay=(?P<send_delay>[^,]+),.*status=(?P<status>(sent|deferred|bounced))')
+        # fields from the line (in this case, send_delay and status). It is searched
+        # for, so there is no leading '.*' to backtrack over the whole line.
+        self.reg = re.compile('delay=(?P<send_delay>[^,]+),.*status=(?P<status>sent|deferred|bounced)')
            
     def parse_line(self, line):
         '''This function should digest the contents of one line at a time, updating
         object's state variables. Takes a single argument, the line to be parsed.'''
         
         try:
-            # Apply regular expression to each line and extract interesting bits.
-            regMatch = self.reg.match(line)
+            # Apply regular expression to each line and extract interesting bits,
+            # skipping lines that carry no delivery status cheaply.
+            regMatch = 'status=' in line and self.reg.search(line)
 
             if regMatch:
                linebits = regMatch.groupdict()
@@ -57,11 +59,22 @@ class PostfixLogster(LogsterParser):
                   self.numDeferred += 1
                elif (linebits['status'] == 'bounced'):
                   self.numBounced += 1
+            else:
+               return self.SKIPPED
 
         except Exception, e:
             raise LogsterParsingException, "regmatch or contents failed with %s" % e
 
 
+    def merge(self, other):
+        '''Add the counts of another instance that parsed a later part of the log.'''
+        self.numSent += other.numSent
+        self.numDeferred += other.numDeferred
+        self.numBounced += other.numBounced
+        self.totalDelay += other.totalDelay
+        self.numRbl += other.numRbl
+
+
     def get_state(self, duration):
         '''Run any necessary calculations on the data collected from the logs
         and return a list of metric objects.'''
@@ -0,0 +1,253 @@
+###  A parser configured from a file of rules instead of code. Each rule has a
+###  regular expression and says which metric to make of the lines it matches:
+###
+###    - count:      the rate of matching lines (the default)
+###    - sum:        the rate of a captured number, e.g. bytes per second
+###    - histogram:  the mean, median and percentiles of a captured number
+###
+###  and with group_by, one metric per value of one or more captures, named
+###  after the rule's metric and the captured values.
+###
+###  Every rule that matches a line is applied. A line is first checked for the
+###  literal text that each rule needs (found from its pattern, or given as
+###  'prefilter'), with a single combined search; only the rules whose text
+###  is there are tried, so lines that no rule wants cost one scan however many
+###  rules there are.
+###
+###  The rules file is read as YAML when PyYAML is installed, and as JSON
+###  otherwise:
+###
+###    rules:
+###      - metric: http_status
+###        pattern: 'HTTP/1\.\d" (?P<status>\d)\d\d '
+###        group_by: status
+###      - metric: bytes
+###        pattern: 'HTTP/1\.\d" \d{3} (?P<bytes>\d+) '
+###        sum: bytes
+###      - metric: response_time
+###        pattern: ' (?P<usec>\d+)$'
+###        histogram: usec
+###        percentiles: [50, 90, 99]
+###        unit: usec
+###
+###  For example:
+###  sudo ./logster --dry-run --output=stdout --parser-options '--rules /etc/logster/httpd.yaml' RegexLogster /var/log/httpd/access_log
+
+import json
+import optparse
+import re
+import sre_constants
+import sre_parse
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from logster.parsers import stats_helper
+
+from logster.logster_helper import MetricObject, LogsterParser
+
+def required_literal(pattern):
+    '''Return the longest run of literal text that every match of pattern
+    contains, or '' if there is none that can be relied on.'''
+    try:
+        parsed = sre_parse.parse(pattern)
+    except sre_constants.error:
+        return ''
+    if parsed.pattern.flags & (sre_constants.SRE_FLAG_IGNORECASE | sre_constants.SRE_FLAG_VERBOSE):
+        return ''
+
+    longest = current = pattern[:0]
+    for op, argument in parsed:
+        if op == sre_constants.LITERAL:
+            current += unichr(argument) if isinstance(pattern, unicode) else chr(argument)
+            if len(current) > len(longest):
+                longest = current
+        else:
+            current = pattern[:0]
+    return longest
+
+
+class Rule(object):
+    '''One entry of the rules file, with its compiled pattern.'''
+
+    def __init__(self, config):
+        try:
+            # Lines are byte strings, so are the patterns matched against them
+            # and the metric names made from the matches.
+            self.metric = config['metric']
+            if isinstance(self.metric, unicode):
+                self.metric = self.metric.encode('utf-8')
+            pattern = config['pattern']
+            if isinstance(pattern, unicode):
+                pattern = pattern.encode('utf-8')
+            self.regex = re.compile(pattern)
+        except KeyError, e:
+            raise ValueError("Rule %r has no %s" % (config, e))
+        except sre_constants.error, e:
+            raise ValueError("Rule %s has a bad pattern: %s" % (config['metric'], e))
+
+        self.action = 'count'
+        self.field = None
+        for action in ('sum', 'histogram'):
+            if action in config:
+                self.action = action
+                self.field = config[action]
+
+        group_by = config.get('group_by', [])
+        if isinstance(group_by, basestring):
+            group_by = [group_by]
+        self.group_by = group_by
+
+        for field in [self.field] + self.group_by:
+            if field is not None and field not in self.regex.groupindex:
+                raise ValueError("Rule %s has no named group '%s'" % (self.metric, field))
+
+        self.percentiles = [int(percentile) for percentile in config.get('percentiles', [90])]
+        self.unit = config.get('unit', '')
+        self.prefilter = config.get('prefilter', required_literal(pattern))
+        if isinstance(self.prefilter, unicode):
+            self.prefilter = self.prefilter.encode('utf-8')
+
+    def metric_name(self, match):
+        '''Return the metric name for a match of this rule.'''
+        if not self.group_by:
+            return self.metric
+        values = [match.group(field) or 'none' for field in self.group_by]
+        return '.'.join([self.metric] + [re.sub('[^\w-]', '_', value) for value in values])
+
+
+class RegexLogster(LogsterParser):
+
+    def __init__(self, option_string=None):
+        '''Initialize any data structures or variables needed for keeping track
+        of the tasty bits we find in the log we are parsing.'''
+
+        if option_string:
+            options = option_string.split(' ')
+        else:
+            options = []
+
+        optparser = optparse.OptionParser()
+        optparser.add_option('--rules', '-r', dest='rules',
+                            help='YAML (or JSON) file listing the patterns to match and the metrics to make of them.')
+
+        opts, args = optparser.parse_args(args=options)
+        if not opts.rules:
+            raise RuntimeError('RegexLogster needs a rules file, see --rules.')
+
+        f = open(opts.rules)
+        try:
+            if yaml is not None:
+                config = yaml.safe_load(f)
+            else:
+                config = json.load(f)
+        finally:
+            f.close()
+
+        self.rules = [Rule(rule) for rule in config['rules']]
+
+        # One search for the text that any of the rules needs. If a rule
+        # needs no particular text, every line has to be tried.
+        if self.rules and all(rule.prefilter for rule in self.rules):
+            self.prefilter = re.compile('|'.join([re.escape(rule.prefilter) for rule in self.rules]))
+        else:
+            self.prefilter = None
+
+        # Running totals by metric name: counts and sums of values, and the
+        # values of histograms.
+        self.counts = {}
+        self.sums = {}
+        self.histograms = {}
+
+    def parse_line(self, line):
+        '''This function should digest the contents of one line at a time, updating
+        object's state variables. Takes a single argument, the line to be parsed.'''
+
+        if self.prefilter is not None and not self.prefilter.search(line):
+            return self.SKIPPED
+
+        status = self.SKIPPED
+        try:
+            for rule in self.rules:
+                if rule.prefilter and rule.prefilter not in line:
+                    continue
+                match = rule.regex.search(line)
+                if not match:
+                    continue
+
+                status = self.MATCHED
+                name = rule.metric_name(match)
+                if rule.action == 'count':
+                    self.counts[name] = self.counts.get(name, 0) + 1
+                elif rule.action == 'sum':
+                    self.sums[name] = self.sums.get(name, 0.0) + float(match.group(rule.field))
+                else:
+                    histogram = self.histograms.get(name)
+                    if histogram is None:
+                        histogram = self.histograms[name] = (rule, stats_helper.ExactQuantiles())
+                    histogram[1].add(float(match.group(rule.field)))
+
+        except (TypeError, ValueError):
+            # The captured value is not a number.
+            return self.ERROR
+
+        return status
+
+    def parse_lines(self, lines):
+        '''Find the lines of a whole block that any rule may want in one scan,
+        and only hand those to parse_line.'''
+        if self.prefilter is None:
+            return LogsterParser.parse_lines(self, lines)
+
+        if not isinstance(lines, basestring):
+            lines = ''.join(lines)
+
+        search = self.prefilter.search
+        candidates = 0
+        match = search(lines)
+        while match:
+            # The line with its newline, as parse_line would see it.
+            start = lines.rfind('\n', 0, match.start()) + 1
+            end = lines.find('\n', match.end()) + 1
+            if end == 0:
+                end = len(lines)
+            candidates += 1
+            status = self.parse_line(lines[start:end])
+            if status == self.SKIPPED:
+                self._lines_skipped += 1
+            elif status == self.ERROR:
+                self._lines_failed += 1
+            match = search(lines, end)
+
+        self.count_skipped(lines, candidates)
+
+    def merge(self, other):
+        '''Add the totals and values of another instance that parsed a later part of the log.'''
+        for name, count in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+        for name, total in other.sums.items():
+            self.sums[name] = self.sums.get(name, 0.0) + total
+        for name, (rule, values) in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name][1].merge(values)
+            else:
+                self.histograms[name] = (rule, values)
+
+    def get_state(self, duration):
+        '''Run any necessary calculations on the data collected from the logs
+        and return a list of metric objects.'''
+        metrics = []
+        if duration > 0:
+            metrics += [MetricObject(name, float(count) / duration, 'Lines per sec') for name, count in self.counts.items()]
+            metrics += [MetricObject(name, total / duration, 'Per sec') for name, total in self.sums.items()]
+
+        for name, (rule, values) in self.histograms.items():
+            summary = values.summarize(rule.percentiles)
+            metrics.append(MetricObject(name + '.mean', summary['mean'], rule.unit))
+            metrics.append(MetricObject(name + '.median', summary['median'], rule.unit))
+            metrics += [MetricObject('%s.%sth_percentile' % (name, percentile), summary['percentiles'][percentile], rule.unit)
+                        for percentile in rule.percentiles]
+
+        return metrics
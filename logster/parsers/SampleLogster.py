@@ -42,7 +42,14 @@ class SampleLogster(LogsterParser):
         
         # Regular expression for matching lines we are interested in, and capturing
         # fields from the line (in this case, http_status_code).
-        self.reg = re.compile('.*HTTP/1.\d\" (?P<http_status_code>\d{3}) .*')
+        # It is searched for rather than matched from the start of the line, as a
+        # leading '.*' would have to backtrack over the whole line.
+        self.reg = re.compile('HTTP/1.\d\" (?P<http_status_code>\d{3}) ')
+
+        # The same match applied to a whole block at once, capturing just the
+        # first digit of the status code. Servers escape quotes inside the
+        # request and headers, so it is found at most once per line.
+        self.block_reg = re.compile('HTTP/1.\d\" (\d)\d\d ')
 
 
     def parse_line(self, line):
@@ -50,8 +57,9 @@ class SampleLogster(LogsterParser):
         object's state variables. Takes a single argument, the line to be parsed.'''
 
         try:
-            # Apply regular expression to each line and extract interesting bits.
-            regMatch = self.reg.match(line)
+            # Apply regular expression to each line and extract interesting bits,
+            # skipping lines without a protocol version cheaply.
+            regMatch = 'HTTP/1' in line and self.reg.search(line)
 
             if regMatch:
                 linebits = regMatch.groupdict()
@@ -69,12 +77,40 @@ class SampleLogster(LogsterParser):
                     self.http_5xx += 1
 
             else:
-                raise LogsterParsingException, "regmatch failed to match"
+                return self.SKIPPED
 
         except Exception, e:
             raise LogsterParsingException, "regmatch or contents failed with %s" % e
 
 
+    def parse_lines(self, lines):
+        '''Tally the response codes of a whole block of lines in one scan.'''
+        if not isinstance(lines, basestring):
+            lines = ''.join(lines)
+
+        status_classes = self.block_reg.findall(lines)
+        http_1xx = status_classes.count('0') + status_classes.count('1')
+        http_2xx = status_classes.count('2')
+        http_3xx = status_classes.count('3')
+        http_4xx = status_classes.count('4')
+
+        self.http_1xx += http_1xx
+        self.http_2xx += http_2xx
+        self.http_3xx += http_3xx
+        self.http_4xx += http_4xx
+        self.http_5xx += len(status_classes) - http_1xx - http_2xx - http_3xx - http_4xx
+        self.count_skipped(lines, len(status_classes))
+
+
+    def merge(self, other):
+        '''Add the counts of another instance that parsed a later part of the log.'''
+        self.http_1xx += other.http_1xx
+        self.http_2xx += other.http_2xx
+        self.http_3xx += other.http_3xx
+        self.http_4xx += other.http_4xx
+        self.http_5xx += other.http_5xx
+
+
     def get_state(self, duration):
         '''Run any necessary calculations on the data collected from the logs
         and return a list of metric objects.'''
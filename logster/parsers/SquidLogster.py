@@ -50,7 +50,14 @@ class SquidLogster(LogsterParser):
 
         # Regular expression for matching lines we are interested in, and capturing
         # fields from the line (in this case, http_status_code, size and squid_code).
-        self.reg = re.compile('^[0-9.]+ +(?P<size>[0-9]+) .*(?P<squid_code>(TCP|UDP|NONE)_[A-Z_]+)/(?P<http_status_code>\d{3}) .*')
+        # The squid code is the first one after the size, so the gap is matched
+        # lazily and nothing after the status code is matched at all.
+        self.reg = re.compile('[0-9.]+ +(?P<size>[0-9]+) .*?(?P<squid_code>(?:TCP|UDP|NONE)_[A-Z_]+)/(?P<http_status_code>\d{3}) ')
+
+        # The same match applied to every line of a block at once. Lines are found
+        # by their leading newline, which the regex engine can scan for much faster
+        # than it can try '^' at every position.
+        self.block_reg = re.compile('\n[0-9.]+ +([0-9]+) .*?((?:TCP|UDP|NONE)_[A-Z_]+)/(\d{3}) ')
 
 
     def parse_line(self, line):
@@ -86,12 +93,52 @@ class SquidLogster(LogsterParser):
                 self.size_transferred += size
 
             else:
-                raise LogsterParsingException, "regmatch failed to match"
+                return self.SKIPPED
 
         except Exception, e:
             raise LogsterParsingException, "regmatch or contents failed with %s" % e
 
 
+    def parse_lines(self, lines):
+        '''Tally the response and squid codes of a whole block of lines in one scan.'''
+        if not isinstance(lines, basestring):
+            lines = ''.join(lines)
+
+        matches = self.block_reg.findall('\n' + lines)
+        self.count_skipped(lines, len(matches))
+        for size, squid_code, status in matches:
+            status = int(status)
+            if (status < 200):
+                self.http_1xx += 1
+            elif (status < 300):
+                self.http_2xx += 1
+            elif (status < 400):
+                self.http_3xx += 1
+            elif (status < 500):
+                self.http_4xx += 1
+            else:
+                self.http_5xx += 1
+
+            if self.squid_codes.has_key(squid_code):
+                self.squid_codes[squid_code] += 1
+            else:
+                self.squid_codes['OTHER'] += 1
+
+            self.size_transferred += int(size)
+
+
+    def merge(self, other):
+        '''Add the counts of another instance that parsed a later part of the log.'''
+        self.http_1xx += other.http_1xx
+        self.http_2xx += other.http_2xx
+        self.http_3xx += other.http_3xx
+        self.http_4xx += other.http_4xx
+        self.http_5xx += other.http_5xx
+        self.size_transferred += other.size_transferred
+        for squid_code in other.squid_codes:
+            self.squid_codes[squid_code] += other.squid_codes[squid_code]
+
+
     def get_state(self, duration):
         '''Run any necessary calculations on the data collected from the logs
         and return a list of metric objects.'''
@@ -3,6 +3,19 @@
 ###  A helper to assist with the calculation of statistical functions. This has probably been done better elsewhere but I wanted an easy import.
 ###
 ###  Percentiles are calculated with linear interpolation between points.
+###
+###  To get several statistics of the same values use summarize(), which sorts
+###  them only once. It uses NumPy when it is installed.
+
+import math
+import random
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 def find_median(numbers):
     return find_percentile(numbers,50)
@@ -10,6 +23,9 @@ def find_median(numbers):
 
 def find_percentile(numbers,percentile):
     numbers.sort()
+    return percentile_of_sorted(numbers, percentile)
+
+def percentile_of_sorted(numbers, percentile):
     if len(numbers) == 0:
         return None
     if len(numbers) == 1:
@@ -27,3 +43,283 @@ def find_mean(numbers):
         return None
     else:
         return sum(numbers,0.0) / len(numbers)
+
+def summarize(numbers, percentiles=()):
+    '''Return a dict with the count, mean, median, min, max and (population)
+    stddev of numbers, and under 'percentiles' a dict of each of the requested
+    percentiles. numbers is left untouched and is sorted only once.'''
+    count = len(numbers)
+    summary = {'count': count, 'mean': None, 'median': None, 'min': None,
+               'max': None, 'stddev': None,
+               'percentiles': dict((percentile, None) for percentile in percentiles)}
+    if count == 0:
+        return summary
+
+    if numpy is not None:
+        if isinstance(numbers, array) and numbers.typecode == 'd':
+            data = numpy.frombuffer(numbers, dtype=numpy.float64)
+        else:
+            data = numpy.asarray(numbers, dtype=numpy.float64)
+        data = numpy.sort(data)
+        mean = float(data.mean())
+        stddev = float(data.std())
+    else:
+        data = sorted(numbers)
+        mean = sum(data, 0.0) / count
+        stddev = math.sqrt(sum((number - mean) ** 2 for number in data) / count)
+
+    summary['mean'] = mean
+    summary['stddev'] = stddev
+    summary['min'] = float(data[0])
+    summary['max'] = float(data[-1])
+    summary['median'] = float(percentile_of_sorted(data, 50))
+    for percentile in percentiles:
+        summary['percentiles'][percentile] = float(percentile_of_sorted(data, percentile))
+    return summary
+
+
+###  Quantile engines keep the values of a timer and answer percentile queries
+###  about them. They all provide add(value), merge(other), mean(),
+###  percentile(percentile) and summarize(percentiles), which returns the same
+###  dict as the summarize() function, so parsers can pick one with an option.
+
+class ExactQuantiles(object):
+    '''Keeps every value, percentiles are exact. Values are stored as a
+    compact array of doubles, but memory still grows with their number, so
+    this is best for small inputs.
+
+    With max_samples set, only a uniform random sample (a reservoir) of that
+    many values is kept once more arrive. Percentiles and stddev are then
+    estimated from the sample, while count, sum, mean, min and max stay
+    exact.'''
+
+    def __init__(self, max_samples=None):
+        if max_samples is not None and max_samples < 1:
+            raise ValueError("max_samples must be at least 1")
+        self.values = array('d')
+        self.max_samples = max_samples
+        self.limit = max_samples or sys.maxsize
+        # Exact totals, only tracked once values start being sampled.
+        self.sampled = False
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def __len__(self):
+        if self.sampled:
+            return self.count
+        return len(self.values)
+
+    def add(self, value):
+        if len(self.values) < self.limit:
+            self.values.append(value)
+        else:
+            self.sample(value)
+
+    def totals(self):
+        '''Return the count, sum, min and max of all values added.'''
+        if self.sampled:
+            return self.count, self.sum, self.min, self.max
+        if not self.values:
+            return 0, 0.0, None, None
+        return len(self.values), sum(self.values, 0.0), min(self.values), max(self.values)
+
+    def start_sampling(self):
+        if not self.sampled:
+            self.count, self.sum, self.min, self.max = self.totals()
+            self.sampled = True
+
+    def sample(self, value):
+        self.start_sampling()
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        # Algorithm R: the n-th value replaces a random one with probability
+        # max_samples / n.
+        index = int(random.random() * self.count)
+        if index < len(self.values):
+            self.values[index] = value
+
+    def merge(self, other):
+        if not self.sampled and not other.sampled and len(self.values) + len(other.values) <= self.limit:
+            self.values.extend(other.values)
+            return
+
+        count, total, minimum, maximum = other.totals()
+        self.start_sampling()
+
+        # Draw the new reservoir from both samples, weighting each value by
+        # the number of values it stands for.
+        mine = list(self.values)
+        theirs = list(other.values)
+        random.shuffle(mine)
+        random.shuffle(theirs)
+        my_weight = float(self.count) / max(len(mine), 1)
+        their_weight = float(count) / max(len(theirs), 1)
+        values = array('d')
+        while len(values) < self.limit and (mine or theirs):
+            my_share = len(mine) * my_weight
+            if random.random() * (my_share + len(theirs) * their_weight) < my_share:
+                values.append(mine.pop())
+            else:
+                values.append(theirs.pop())
+        self.values = values
+
+        self.count += count
+        self.sum += total
+        if minimum is not None and (self.min is None or minimum < self.min):
+            self.min = minimum
+        if maximum is not None and (self.max is None or maximum > self.max):
+            self.max = maximum
+
+    def mean(self):
+        if self.sampled:
+            return self.sum / self.count
+        return find_mean(self.values)
+
+    def percentile(self, percentile):
+        return percentile_of_sorted(sorted(self.values), percentile)
+
+    def summarize(self, percentiles=()):
+        summary = summarize(self.values, percentiles)
+        if self.sampled:
+            summary['count'] = self.count
+            summary['mean'] = self.sum / self.count
+            summary['min'] = self.min
+            summary['max'] = self.max
+        return summary
+
+
+class DDSketch(object):
+    '''Bounded memory percentile sketch, after DDSketch (Masson et al., 2019).
+
+    Values are counted in logarithmic buckets so that any percentile is
+    returned within relative_accuracy of a value at that rank. At most
+    max_buckets buckets are kept per sign; beyond that the buckets closest to
+    zero are folded together, which only costs accuracy on the lowest
+    percentiles. The mean, minimum and maximum are exact.'''
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_squares = 0.0
+        self.min = None
+        self.max = None
+
+    def __len__(self):
+        return self.count
+
+    def key(self, value):
+        return int(math.ceil(math.log(value) / self.log_gamma))
+
+    def bucket_value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value):
+        if value > 0:
+            key = int(math.ceil(math.log(value) / self.log_gamma))
+            if key in self.positive:
+                self.positive[key] += 1
+            else:
+                self.insert(self.positive, key, 1)
+        elif value < 0:
+            self.insert(self.negative, self.key(-value), 1)
+        else:
+            self.zero_count += 1
+        self.count += 1
+        self.sum += value
+        self.sum_squares += value * value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def insert(self, buckets, key, count):
+        if key in buckets:
+            buckets[key] += count
+            return
+        buckets[key] = count
+        if len(buckets) > self.max_buckets:
+            lowest = sorted(buckets)[:2]
+            buckets[lowest[1]] += buckets.pop(lowest[0])
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracies")
+        for key, count in other.positive.items():
+            self.insert(self.positive, key, count)
+        for key, count in other.negative.items():
+            self.insert(self.negative, key, count)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        for value in (other.min, other.max):
+            if value is not None:
+                if self.min is None or value < self.min:
+                    self.min = value
+                if self.max is None or value > self.max:
+                    self.max = value
+
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.sum / self.count
+
+    def percentile(self, percentile):
+        if self.count == 0:
+            return None
+        if percentile <= 0:
+            return self.min
+        if percentile >= 100:
+            return self.max
+
+        rank = float(percentile) / 100 * (self.count - 1)
+        seen = 0
+        value = None
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                value = -self.bucket_value(key)
+                break
+        else:
+            seen += self.zero_count
+            if seen > rank:
+                value = 0.0
+            else:
+                for key in sorted(self.positive):
+                    seen += self.positive[key]
+                    if seen > rank:
+                        value = self.bucket_value(key)
+                        break
+                else:
+                    value = self.max
+        return min(max(value, self.min), self.max)
+
+    def summarize(self, percentiles=()):
+        summary = {'count': self.count, 'mean': self.mean(), 'median': self.percentile(50),
+                   'min': self.min, 'max': self.max, 'stddev': None,
+                   'percentiles': dict((percentile, self.percentile(percentile)) for percentile in percentiles)}
+        if self.count:
+            variance = self.sum_squares / self.count - summary['mean'] ** 2
+            summary['stddev'] = math.sqrt(max(variance, 0.0))
+        return summary
+
+
+quantile_engines = {
+    'exact': ExactQuantiles,
+    'ddsketch': DDSketch,
+}
@@ -0,0 +1,21 @@
+'''Helpers shared by the parser tests.'''
+
+from logster.logster_helper import LogsterParsingException
+
+def parse_each_line(parser, lines):
+    '''Hand lines to parser.parse_line one at a time, skipping the ones it
+    raises LogsterParsingException for, and return the parser.'''
+    for line in lines:
+        try:
+            parser.parse_line(line)
+        except LogsterParsingException:
+            pass
+    return parser
+
+def metric_values(parser, duration=10):
+    '''Return the value of each metric from parser.get_state(), by name.'''
+    return dict((m.name, m.value) for m in parser.get_state(duration))
+
+def parsed_values(parser, lines, duration=10):
+    '''Parse lines one at a time and return the values of the metrics.'''
+    return metric_values(parse_each_line(parser, lines), duration)
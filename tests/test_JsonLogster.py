@@ -1,5 +1,6 @@
-from logster.parsers.JsonLogster import JsonLogster
+from logster.parsers.JsonLogster import JsonLogster, KeyPathCache, KeySelector
 from logster.logster_helper import MetricObject
+from parser_helper import metric_values
 import unittest
 
 class TestJsonLogster(unittest.TestCase):
@@ -49,6 +50,116 @@ class TestJsonLogster(unittest.TestCase):
         flattened = self.json_logster.flatten_object(self.json_data, self.key_separator, self.key_filter_callback)
         self.assertEquals(flattened, self.flattened_should_be)
 
+    def test_flatten_object_parent_keys(self):
+        flattened = self.json_logster.flatten_object({'a': {'b': 1}}, '.', None, ['x', 'y'])
+        self.assertEquals(flattened, {'x.y.a.b': 1})
+
+    def test_parse_line(self):
+        self.json_logster.parse_line('{"a": {"b": {"c": {"d": 1}}, "e": 2.5}, "f": "g/h"}')
+        self.json_logster.parse_line('{"a": {"e": 3}, "f/i": {}}')
+        self.assertEquals(self.json_logster.metrics, {
+            'a&b&c&d': 1,
+            'a&e': 3,
+            'f': 'g/h',
+        })
+
+    def test_key_cache(self):
+        self.json_logster.parse_line('{"a:b": {"c": 1, "d": {"e": 1, "f": 2}}}')
+        self.json_logster.parse_line('{"a:b": {"c": 2, "d": {"e": 3, "f": 4}}}')
+        self.assertEquals(self.json_logster.metrics, {'a_b&c': 2, 'a_b&d&e': 3, 'a_b&d&f': 4})
+        self.assertEquals(self.json_logster.key_cache.misses, 5)
+        self.assertEquals(self.json_logster.key_cache.hits, 5)
+
+    def test_key_cache_opt_in(self):
+        class FilteringLogster(JsonLogster):
+            def key_filter(self, key):
+                return key
+        self.assertEquals(FilteringLogster().key_cache, None)
+        FilteringLogster.cacheable_key_filter = True
+        self.assertNotEquals(FilteringLogster().key_cache, None)
+        self.assertEquals(JsonLogster('--key-cache-size 0').key_cache, None)
+
+    def test_key_path_cache_evicts_unused_paths(self):
+        cache = KeyPathCache(4)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('c', 3)
+        self.assertEquals(cache.get('a'), 1)
+        cache.put('d', 4)
+        cache.put('e', 5)
+        self.assertEquals(cache.get('b'), None)
+        self.assertEquals(cache.get('a'), 1)
+        self.assertEquals(cache.get('e'), 5)
+
+    def test_selected_keys(self):
+        json_logster = JsonLogster('--keys a.b,c --key-glob d.*.p99')
+        json_logster.parse_line('{"a": {"b": 1, "x": 2}, "c": {"y": 3}, "d": {"e": {"p99": 4, "p50": 5}, "f": {"p99": 6}}, "g": 7}')
+        json_logster.parse_line('{"c": 8}')
+        self.assertEquals(json_logster.parse_line('{"g": 9}'), json_logster.SKIPPED)
+        self.assertEquals(json_logster.metrics, {'a.b': 1, 'c': 8, 'd.e.p99': 4, 'd.f.p99': 6})
+
+    def test_selected_keys_skip_subtrees(self):
+        walked = []
+        class RecordingLogster(JsonLogster):
+            cacheable_key_filter = True
+            def key_filter(self, key):
+                walked.append(key)
+                return key
+        json_logster = RecordingLogster('--keys a.b')
+        json_logster.parse_line('{"a": {"b": 1}, "z": {"y": {"x": 1}}}')
+        self.assertEquals(json_logster.metrics, {'a.b': 1})
+        self.assertEquals(sorted(walked), ['a', 'b', 'z'])
+
+    def test_key_selector(self):
+        selector = KeySelector(['a.b.c'], ['x.y*'], '.')
+        self.assertTrue(selector.wants('a.b.c'))
+        self.assertFalse(selector.wants('a.b'))
+        self.assertTrue(selector.wants_prefix('a.b.'))
+        self.assertFalse(selector.wants_prefix('a.c.'))
+        self.assertTrue(selector.wants('x.yz.w'))
+        self.assertTrue(selector.wants_prefix('x.'))
+        self.assertTrue(selector.wants_prefix('x.yz.'))
+        self.assertFalse(selector.wants_prefix('x.z.'))
+
+    def test_aggregate(self):
+        json_logster = JsonLogster('--aggregate a.*=sum,b=min,c=max,d=mean,e=count,f=rate,*.g=last')
+        for line in [
+            '{"a": {"x": 1, "y": 2.5, "g": 1}, "b": 3, "c": 3, "d": 1, "e": "one", "f": 10, "h": 1}',
+            '{"a": {"x": 2, "y": 2.5, "g": 2}, "b": 1, "c": 5, "d": 2, "e": "two", "f": 20, "h": 2}',
+            '{"a": {"x": 3}, "b": 2, "c": 4, "d": 4, "f": "n/a", "h": 3}',
+        ]:
+            json_logster.parse_line(line)
+        self.assertEquals(metric_values(json_logster), {
+            'a.x': 6,
+            'a.y': 5.0,
+            'a.g': 3,
+            'b': 1,
+            'c': 5,
+            'd': 7 / 3.0,
+            'e': 2,
+            'f': 3.0,
+            'h': 3,
+        })
+
+    def test_aggregate_merge(self):
+        lines = ['{"a": %d, "b": %d, "c": %d}' % (i, 10 - i, i) for i in range(10)]
+        options = '--aggregate a=mean,b=min,c=rate'
+        whole = JsonLogster(options)
+        first = JsonLogster(options)
+        second = JsonLogster(options)
+        for line in lines:
+            whole.parse_line(line)
+        for line in lines[:4]:
+            first.parse_line(line)
+        for line in lines[4:]:
+            second.parse_line(line)
+        first.merge(second)
+        self.assertEquals(metric_values(first), metric_values(whole))
+
+    def test_aggregate_bad_mode(self):
+        self.assertRaises(RuntimeError, JsonLogster, '--aggregate a=median')
+        self.assertRaises(RuntimeError, JsonLogster, '--aggregate sum')
+
     def test_infer_metric_type(self):
         self.assertEquals('float', self.json_logster.infer_metric_type(1.2))
         self.assertEquals('int32', self.json_logster.infer_metric_type(1))
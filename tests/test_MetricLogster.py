@@ -0,0 +1,39 @@
+from logster.parsers.MetricLogster import MetricLogster
+import unittest
+
+class TestMetricLogster(unittest.TestCase):
+    def setUp(self):
+        self.parser = MetricLogster('--percentiles 90')
+        for line in [
+            '2015-01-01 00:00:00 INFO Started request',
+            '2015-01-01 00:00:00 INFO METRIC_TIME metric=some.metric.time value=10ms',
+            '2015-01-01 00:00:01 INFO METRIC_TIME metric=some.metric.time value=11ms',
+            '2015-01-01 00:00:01 DEBUG METRIC_UNKNOWN metric=other value=1 ',
+            '2015-01-01 00:00:02 INFO METRIC_TIME metric=some.metric.time value=20ms',
+            '2015-01-01 00:00:02 INFO METRIC_COUNT metric=some.metric.count value=1 ',
+            '2015-01-01 00:00:03 INFO METRIC_COUNT metric=some.metric.count value=2.2 after',
+            '2015-01-01 00:00:03 INFO METRIC_COUNT metric=no.trailer value=5',
+            '2015-01-01 00:00:04 INFO METRIC_TIME metric=unitless.time value=4',
+        ]:
+            self.parser.parse_line(line)
+
+    def test_state(self):
+        metrics = dict((m.name, m) for m in self.parser.get_state(1))
+        self.assertEqual(sorted(metrics.keys()), [
+            'some.metric.count',
+            'some.metric.time.90th_percentile',
+            'some.metric.time.mean',
+            'some.metric.time.median',
+            'unitless.time.90th_percentile',
+            'unitless.time.mean',
+            'unitless.time.median',
+        ])
+        self.assertAlmostEqual(metrics['some.metric.count'].value, 3.2)
+        self.assertAlmostEqual(metrics['some.metric.time.mean'].value, 41.0 / 3)
+        self.assertEqual(metrics['some.metric.time.median'].value, 11)
+        self.assertAlmostEqual(metrics['some.metric.time.90th_percentile'].value, 18.2)
+        self.assertEqual(metrics['some.metric.time.mean'].units, 'ms')
+        self.assertEqual(metrics['unitless.time.mean'].units, '')
+
+if __name__ == '__main__':
+    unittest.main()
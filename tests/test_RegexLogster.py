@@ -0,0 +1,114 @@
+from logster.parsers.RegexLogster import RegexLogster, required_literal
+import json
+import os
+import shutil
+import tempfile
+from parser_helper import metric_values
+import unittest
+
+class TestRegexLogster(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.rules = [
+            {'metric': 'http', 'pattern': 'HTTP/1\\.\\d" (?P<status>\\d)\\d\\d ', 'group_by': 'status'},
+            {'metric': 'bytes', 'pattern': 'HTTP/1\\.\\d" \\d{3} (?P<bytes>\\d+) ', 'sum': 'bytes'},
+            {'metric': 'time', 'pattern': ' (?P<usec>\\d+)$', 'histogram': 'usec',
+             'percentiles': [50, 100], 'unit': 'usec', 'prefilter': '"'},
+        ]
+        self.lines = [
+            '127.0.0.1 - - [01/Jan/2015:00:00:00 +0000] "GET / HTTP/1.1" 200 512 "-" "curl" 100\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:01 +0000] "GET /a HTTP/1.1" 404 0 "-" "curl" 300\n',
+            'garbage\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:02 +0000] "GET /b HTTP/1.0" 200 1024 "-" "curl" 200\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:03 +0000] "GET /c HTTP/1.0" 503 - "-" "curl" 400',
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def parser(self, rules=None):
+        rules_file = os.path.join(self.dir, 'rules.json')
+        f = open(rules_file, 'w')
+        json.dump({'rules': rules or self.rules}, f)
+        f.close()
+        return RegexLogster('--rules ' + rules_file)
+
+    def state(self, parser):
+        return metric_values(parser, 2)
+
+    def test_parse_line(self):
+        parser = self.parser()
+        for line in self.lines:
+            parser.parse_line(line)
+        self.assertEqual(self.state(parser), {
+            'http.2': 1.0,
+            'http.4': 0.5,
+            'http.5': 0.5,
+            'bytes': 768.0,
+            'time.mean': 250.0,
+            'time.median': 250.0,
+            'time.50th_percentile': 250.0,
+            'time.100th_percentile': 400.0,
+        })
+
+    def test_parse_lines(self):
+        by_line = self.parser()
+        for line in self.lines:
+            by_line.parse_line(line)
+        by_block = self.parser()
+        by_block.parse_lines(''.join(self.lines))
+        self.assertEqual(self.state(by_block), self.state(by_line))
+
+    def test_lines_keep_their_newline(self):
+        rules = [{'metric': 'lat', 'pattern': 'took (?P<ms>\\d+)\\s$', 'sum': 'ms'}]
+        by_line = self.parser(rules)
+        by_line.parse_line('x took 12\n')
+        by_block = self.parser(rules)
+        by_block.parse_lines('x took 12\ny took 3 \nz\n')
+        self.assertEqual(self.state(by_line), {'lat': 6.0})
+        self.assertEqual(self.state(by_block), {'lat': 7.5})
+
+    def test_metric_names_are_bytes(self):
+        parser = self.parser()
+        parser.parse_lines(''.join(self.lines))
+        for metric in parser.get_state(2):
+            self.assertTrue(isinstance(metric.name, bytes))
+
+    def test_without_prefilter(self):
+        rules = self.rules + [{'metric': 'any', 'pattern': '^(GET|POST)'}]
+        parser = self.parser(rules)
+        self.assertEqual(parser.prefilter, None)
+        parser.parse_lines(''.join(self.lines))
+        self.assertEqual(self.state(parser)['bytes'], 768.0)
+
+    def test_merge(self):
+        whole = self.parser()
+        whole.parse_lines(''.join(self.lines))
+        merged = self.parser()
+        merged.parse_lines(''.join(self.lines[:2]))
+        other = self.parser()
+        other.parse_lines(''.join(self.lines[2:]))
+        merged.merge(other)
+        self.assertEqual(self.state(merged), self.state(whole))
+
+    def test_bad_value(self):
+        parser = self.parser([{'metric': 'n', 'pattern': 'n=(?P<n>\\S+)', 'sum': 'n'}])
+        self.assertEqual(parser.parse_line('n=abc'), parser.ERROR)
+        self.assertEqual(parser.parse_line('n=1'), parser.MATCHED)
+        self.assertEqual(parser.parse_line('m=1'), parser.SKIPPED)
+        parser.parse_lines('n=abc\nn=1\nm=1\nn=2\n')
+        self.assertEqual((parser._lines_skipped, parser._lines_failed), (1, 1))
+
+    def test_bad_rules(self):
+        self.assertRaises(ValueError, self.parser, [{'metric': 'n', 'pattern': 'n=(\\d+)', 'sum': 'n'}])
+        self.assertRaises(ValueError, self.parser, [{'metric': 'n', 'pattern': 'n=(\\d+'}])
+        self.assertRaises(ValueError, self.parser, [{'pattern': 'n'}])
+
+    def test_required_literal(self):
+        self.assertEqual(required_literal('HTTP/1\\.\\d" (\\d{3}) '), 'HTTP/1.')
+        self.assertEqual(required_literal('^ERROR (?P<code>\\d+) failed'), ' failed')
+        self.assertEqual(required_literal('a|b'), '')
+        self.assertEqual(required_literal('(?i)error'), '')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,16 @@
-from logster.logster_helper import CloudWatch, MetricObject
+from logster.logster_helper import CloudWatch, CloudWatchException, MetricObject
 from time import time, strftime, gmtime
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
 class TestCloudWatch(unittest.TestCase):
 
     def setUp(self):
@@ -30,6 +39,85 @@ class TestCloudWatch(unittest.TestCase):
         self.assertEqual(self.cw.url_params['SignatureVersion'], '2')
         self.assertEqual(self.cw.url_params['Version'], '2010-08-01')
 
+class FakeAWSHandler(BaseHTTPRequestHandler):
+    '''Answers both the meta data and the CloudWatch requests.'''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.server.connections.add(self.client_address)
+        status = self.server.status
+        if self.path == '/latest/meta-data/instance-id':
+            status, body = self.server.metadata
+        else:
+            body = b'<PutMetricDataResponse/>'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestCloudWatchRequests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), FakeAWSHandler)
+        self.server.requests = []
+        self.server.connections = set()
+        self.server.status = 200
+        self.server.metadata = (200, b'i-12345678')
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.address = '127.0.0.1:%s' % self.server.server_address[1]
+        self.dir = tempfile.mkdtemp()
+
+        timestamp = strftime("%Y%m%dT%H:%M:00Z", gmtime())
+        self.metrics = [MetricObject("metric%d" % i, i, "None", timestamp=timestamp) for i in range(45)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def cloudwatch(self):
+        return CloudWatch("key", "secretkey", self.metrics, base_url=self.address, metadata_host=self.address)
+
+    def test_instance_id_is_cached(self):
+        cache_file = os.path.join(self.dir, 'instance-id')
+        self.assertEqual(self.cloudwatch().get_instance_id(cache_file=cache_file).instance_id, 'i-12345678')
+        self.assertEqual(self.cloudwatch().get_instance_id(cache_file=cache_file).instance_id, 'i-12345678')
+        self.assertEqual(self.server.requests, ['/latest/meta-data/instance-id'])
+
+    def test_bad_instance_id_is_not_cached(self):
+        cache_file = os.path.join(self.dir, 'instance-id')
+        for metadata in [(503, b'<html><body>Service Unavailable</body></html>'), (200, b'')]:
+            self.server.metadata = metadata
+            self.assertRaises(CloudWatchException, self.cloudwatch().get_instance_id, cache_file=cache_file)
+            self.assertFalse(os.path.exists(cache_file))
+
+        self.server.metadata = (200, b'i-12345678')
+        self.assertEqual(self.cloudwatch().get_instance_id(cache_file=cache_file).instance_id, 'i-12345678')
+
+    def test_put_data_batches(self):
+        cw = self.cloudwatch().get_instance_id("myserverID")
+        cw.put_data()
+        cw.close()
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertTrue('MetricData.member.20.MetricName=metric19' in self.server.requests[0])
+        self.assertFalse('MetricData.member.21.' in self.server.requests[0])
+        self.assertTrue('MetricData.member.1.MetricName=metric40' in self.server.requests[2])
+        self.assertTrue('MetricData.member.5.MetricName=metric44' in self.server.requests[2])
+
+    def test_put_data_error(self):
+        self.server.status = 400
+        cw = self.cloudwatch().get_instance_id("myserverID")
+        self.assertRaises(CloudWatchException, cw.put_data)
+        cw.close()
+
 if __name__ == '__main__':
     unittest.main()
 
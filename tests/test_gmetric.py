@@ -0,0 +1,82 @@
+from logster.logster_helper import Gmetric, MetricObject, read_gmond_channels, parse_gmetric_options
+import os
+import socket
+import struct
+import tempfile
+import unittest
+
+def xdr(*fields):
+    packet = b''
+    for field in fields:
+        if isinstance(field, int):
+            packet += struct.pack('>I', field)
+        else:
+            packet += struct.pack('>I', len(field)) + field + b'\0' * (-len(field) % 4)
+    return packet
+
+class TestGmetric(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(('127.0.0.1', 0))
+        self.receiver.settimeout(1)
+        self.port = self.receiver.getsockname()[1]
+        self.gmetric = Gmetric([('127.0.0.1', self.port, 1)], tmax=60, dmax=180, group='logster',
+                               spoof='10.0.0.1:web01', metadata_interval=60)
+        self.metric = MetricObject('http_2xx', 1.5, 'Responses per sec', type='float', desc='2xx', slope='both')
+
+    def tearDown(self):
+        self.gmetric.close()
+        self.receiver.close()
+
+    def test_metadata_packet(self):
+        self.assertEqual(self.gmetric.metadata_packet('web_http_2xx', 'float', self.metric),
+                         xdr(128, b'10.0.0.1:web01', b'web_http_2xx', 1,
+                             b'float', b'web_http_2xx', b'Responses per sec', 3, 60, 180,
+                             3, b'GROUP', b'logster', b'DESC', b'2xx', b'SPOOF_HOST', b'10.0.0.1:web01'))
+
+    def test_value_packet(self):
+        self.assertEqual(self.gmetric.value_packet('web_http_2xx', self.metric),
+                         xdr(133, b'10.0.0.1:web01', b'web_http_2xx', 1, b'%s', b'1.5'))
+
+    def test_metadata_is_cached(self):
+        self.gmetric.send('web_http_2xx', 'float', self.metric)
+        self.gmetric.send('web_http_2xx', 'float', self.metric)
+        packets = [self.receiver.recv(1500) for i in range(3)]
+        self.assertEqual([struct.unpack('>I', packet[:4])[0] for packet in packets], [128, 133, 133])
+
+    def test_read_gmond_channels(self):
+        conf = tempfile.NamedTemporaryFile(mode='w', suffix='.conf', delete=False)
+        conf.write('''
+/* udp_send_channel { host = commented.example.com } */
+udp_send_channel {
+  # a comment
+  mcast_join = 239.2.11.71
+  port = 8649
+  ttl = 2
+}
+udp_send_channel {
+  host = "gmond.example.com"
+  port = 8650
+}
+udp_recv_channel {
+  port = 8649
+}
+''')
+        conf.close()
+        try:
+            self.assertEqual(read_gmond_channels(conf.name),
+                             [('239.2.11.71', 8649, 2), ('gmond.example.com', 8650, 1)])
+        finally:
+            os.unlink(conf.name)
+
+    def test_parse_gmetric_options(self):
+        settings = parse_gmetric_options('-d 180 -c /etc/ganglia/gmond.conf --group=web -l 5')
+        self.assertEqual(settings['dmax'], 180)
+        self.assertEqual(settings['tmax'], 60)
+        self.assertEqual(settings['conf'], '/etc/ganglia/gmond.conf')
+        self.assertEqual(settings['group'], 'web')
+        self.assertEqual(settings['spoof'], None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+from logster import logster
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+class TestLoadJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.dir, 'jobs.json')
+        self.options, arguments = logster.get_cmdline_optparse().parse_args(['-s', self.dir, '--metric-prefix', 'all'])
+        self.yaml = logster.yaml
+
+    def tearDown(self):
+        logster.yaml = self.yaml
+        shutil.rmtree(self.dir)
+
+    def load(self, jobs):
+        f = open(self.config_file, 'w')
+        json.dump({'jobs': jobs}, f)
+        f.close()
+        return logster.load_jobs(self.config_file, self.options)
+
+    def test_single_parser(self):
+        jobs = self.load([{'parser': 'SampleLogster', 'log-file': '/var/log/a.log', 'output': 'graphite',
+                           'graphite_host': 'graphite:2003', 'output-timeout': 'graphite=5'}])
+        self.assertEqual(len(jobs), 1)
+        name, specs, log_file, options = jobs[0]
+        self.assertEqual((name, log_file), ('SampleLogster /var/log/a.log', '/var/log/a.log'))
+        self.assertEqual(specs, [('SampleLogster', specs[0][1])])
+        # Single values of options that can be given several times become lists.
+        self.assertEqual(options.output, ['graphite'])
+        self.assertEqual(options.output_timeout, ['graphite=5'])
+        self.assertEqual(specs[0][1].output, ['graphite'])
+        # Options the job doesn't override come from the command line, which
+        # is left as it was.
+        self.assertEqual(options.metric_prefix, 'all')
+        self.assertEqual(self.options.output, None)
+
+    def test_parsers(self):
+        jobs = self.load([{'name': 'nginx', 'log_file': '/var/log/nginx.log', 'output': ['stdout'],
+                           'metric_prefix': 'nginx',
+                           'parsers': ['SampleLogster',
+                                       {'parser': 'LineCountLogster', 'metric-prefix': 'lines',
+                                        'output': 'statsd', 'statsd_host': 'statsd:8125'}]}])
+        name, specs, log_file, options = jobs[0]
+        self.assertEqual(name, 'nginx')
+        self.assertEqual([class_name for class_name, parser_options in specs], ['SampleLogster', 'LineCountLogster'])
+        sample_options, line_count_options = [parser_options for class_name, parser_options in specs]
+        self.assertEqual((options.metric_prefix, options.output), ('nginx', ['stdout']))
+        self.assertEqual((sample_options.metric_prefix, sample_options.output), ('nginx', ['stdout']))
+        self.assertEqual((line_count_options.metric_prefix, line_count_options.output), ('lines', ['statsd']))
+        self.assertEqual(line_count_options.statsd_host, 'statsd:8125')
+
+        jobs = self.load([{'log_file': '/var/log/nginx.log', 'output': 'stdout',
+                           'parsers': ['SampleLogster', 'LineCountLogster']}])
+        self.assertEqual(jobs[0][0], 'SampleLogster,LineCountLogster /var/log/nginx.log')
+
+    def test_unknown_options(self):
+        self.assertRaises(ValueError, self.load,
+                          [{'parser': 'SampleLogster', 'log_file': 'a.log', 'output': 'stdout', 'bogus': 1}])
+        self.assertRaises(ValueError, self.load,
+                          [{'log_file': 'a.log', 'output': 'stdout',
+                            'parsers': [{'parser': 'SampleLogster', 'bogus': 1}]}])
+
+    def test_bad_output_options(self):
+        # graphite without --graphite-host
+        self.assertRaises(ValueError, self.load, [{'parser': 'SampleLogster', 'log_file': 'a.log', 'output': 'graphite'}])
+        self.assertRaises(ValueError, self.load,
+                          [{'parser': 'SampleLogster', 'log_file': 'a.log', 'output': 'stdout', 'output_timeout': 'x'}])
+
+    def test_yaml_without_pyyaml(self):
+        logster.yaml = None
+        f = open(self.config_file, 'w')
+        f.write('jobs:\n  - parser: SampleLogster\n    log_file: a.log\n')
+        f.close()
+        try:
+            logster.load_jobs(self.config_file, self.options)
+            self.fail('load_jobs read YAML without PyYAML')
+        except ValueError, e:
+            self.assertTrue('PyYAML' in str(e))
+
+if __name__ == '__main__':
+    unittest.main()
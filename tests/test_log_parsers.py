@@ -0,0 +1,46 @@
+from logster.parsers.SampleLogster import SampleLogster
+from logster.parsers.SquidLogster import SquidLogster
+from logster.parsers.PostfixLogster import PostfixLogster
+from parser_helper import parsed_values
+import unittest
+
+class TestLogParsers(unittest.TestCase):
+    '''Metrics of the bundled parsers over small representative logs.'''
+
+    def state(self, parser_class, lines):
+        return parsed_values(parser_class(), lines, 1)
+
+    def test_sample(self):
+        self.assertEqual(self.state(SampleLogster, [
+            '127.0.0.1 - - [01/Jan/2015:00:00:00 +0000] "GET / HTTP/1.1" 200 512 "-" "curl"\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:01 +0000] "GET /a HTTP/1.0" 404 0 "http://example.com/" "Mozilla/5.0"\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:02 +0000] "GET /\\"HTTP/1.1\\" 200 HTTP/1.1" 503 10 "-" "curl"\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:03 +0000] "GET /b HTTP/1.1" 301 0 "-" "agent \\"HTTP/1.1\\" 200 "\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:04 +0000] "GET /c HTTP/2.0" 200 10 "-" "curl"\n',
+            '[Thu Jan 01 00:00:00 2015] [error] [client 1.2.3.4] File does not exist\n',
+        ]), {'http_1xx': 0, 'http_2xx': 1, 'http_3xx': 1, 'http_4xx': 1, 'http_5xx': 1})
+
+    def test_squid(self):
+        self.assertEqual(self.state(SquidLogster, [
+            '1420070400.000    100 10.0.0.1 TCP_MISS/200 1024 GET http://example.com/TCP_HIT/200 - DIRECT/1.2.3.4 text/html\n',
+            '1420070401.000     50 10.0.0.1 TCP_MEM_HIT/200 2048 GET http://example.com/ - NONE/- text/html\n',
+            '1420070402.000     10 10.0.0.1 TCP_DENIED/403 0 GET http://example.com/ - NONE/- text/html\n',
+            '1420070403.000     10 10.0.0.1 TCP_REFRESH_MISS/304 10 GET http://example.com/ - DIRECT/1.2.3.4 -\n',
+            '1420070404.000      5 10.0.0.1 NONE/400 0 NONE error:invalid-request - NONE/- text/html\n',
+        ]), {'http_1xx': 0, 'http_2xx': 2, 'http_3xx': 1, 'http_4xx': 1, 'http_5xx': 0, 'size': 170,
+             'squid_TCP_MISS': 1, 'squid_TCP_MEM_HIT': 1, 'squid_TCP_DENIED': 1, 'squid_TCP_HIT': 0, 'squid_OTHER': 1})
+
+    def test_postfix(self):
+        self.assertEqual(self.state(PostfixLogster, [
+            'Jan  1 00:00:00 mx postfix/smtpd[1]: connect from unknown[10.0.0.1]\n',
+            'Jan  1 00:00:00 mx postfix/qmgr[2]: ABC: from=<a@b.c>, size=100, nrcpt=1 (queue active)\n',
+            'Jan  1 00:00:01 mx postfix/smtp[3]: ABC: to=<a@b.c>, relay=x[1.2.3.4]:25, delay=1.5, delays=0/0/0/1.5, dsn=2.0.0, status=sent (250 ok)\n',
+            'Jan  1 00:00:02 mx postfix/smtp[3]: ABD: to=<a@b.c>, relay=x[1.2.3.4]:25, delay=2.5, delays=0/0/0/2.5, dsn=2.0.0, status=sent (250 ok)\n',
+            'Jan  1 00:00:03 mx postfix/smtp[3]: ABE: to=<a@b.c>, relay=none, delay=30, delays=0/0/30/0, dsn=4.4.1, status=deferred (timeout)\n',
+            'Jan  1 00:00:04 mx postfix/smtp[3]: ABF: to=<a@b.c>, relay=x[1.2.3.4]:25, delay=2, delays=0/0/0/2, dsn=5.1.1, status=bounced (unknown)\n',
+            'Jan  1 00:00:05 mx postfix/smtp[3]: ABG: to=<a@b.c>, relay=none, delay=1, delays=0/0/1/0, dsn=4.4.1, status=expired, returned to sender\n',
+        ]), {'numSent': 2, 'pctSent': 0, 'numDeferred': 1, 'pctDeferred': 0, 'numBounced': 1, 'pctBounced': 0,
+             'mailTxnsSec': 4, 'mailSentSec': 2, 'avgDelay': 2.0})
+
+if __name__ == '__main__':
+    unittest.main()
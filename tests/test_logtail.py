@@ -0,0 +1,118 @@
+from logster.logster_helper import LogTail, read_blocks, iter_lines
+import os
+import shutil
+import tempfile
+import unittest
+
+class TestLogTail(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.dir, 'test.log')
+        self.state_file = os.path.join(self.dir, 'test.state')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, data, mode='a', path=None):
+        f = open(path or self.log_file, mode)
+        f.write(data)
+        f.close()
+
+    def tail(self, block_size=4):
+        tailer = LogTail(self.log_file, self.state_file, block_size=block_size)
+        tailer.read_state()
+        lines = list(tailer)
+        tailer.write_state()
+        tailer.close()
+        return lines
+
+    def test_seek_to_end(self):
+        self.write('old line\n')
+        tailer = LogTail(self.log_file, self.state_file)
+        tailer.seek_to_end()
+        tailer.write_state()
+        self.write('new line\n')
+        self.assertEqual(self.tail(), ['new line\n'])
+        self.assertEqual(self.tail(), [])
+
+    def test_state_file_format(self):
+        self.write('one\ntwo\n')
+        self.tail()
+        f = open(self.state_file)
+        inode, offset = f.read().split()
+        f.close()
+        self.assertEqual(int(inode), os.stat(self.log_file).st_ino)
+        self.assertEqual(int(offset), 8)
+
+    def test_failed_write_keeps_state(self):
+        class Unwritable(object):
+            def __str__(self):
+                raise IOError('killed')
+
+        self.write('one\ntwo\n')
+        self.tail()
+        tailer = LogTail(self.log_file, self.state_file)
+        tailer.read_state()
+        tailer.offset = Unwritable()
+        self.assertRaises(IOError, tailer.write_state)
+        tailer = LogTail(self.log_file, self.state_file)
+        self.assertTrue(tailer.read_state())
+        self.assertEqual(tailer.offset, 8)
+
+    def test_partial_line_is_left_for_next_run(self):
+        self.write('first line\nsecond')
+        self.assertEqual(self.tail(), ['first line\n'])
+        self.write(' line\n')
+        self.assertEqual(self.tail(), ['second line\n'])
+
+    def test_truncation(self):
+        self.write('a long line of text\n')
+        self.tail()
+        self.write('short\n', mode='w')
+        self.assertEqual(self.tail(), ['short\n'])
+
+    def test_rotation(self):
+        self.write('one\n')
+        self.tail()
+        self.write('two\n')
+        os.rename(self.log_file, self.log_file + '.1')
+        self.write('three\n')
+        self.assertEqual(self.tail(), ['two\n', 'three\n'])
+
+    def test_rotation_while_open(self):
+        self.write('one\n')
+        tailer = LogTail(self.log_file, self.state_file)
+        self.assertEqual(list(tailer), ['one\n'])
+        self.write('two\n')
+        os.rename(self.log_file, self.log_file + '.1')
+        self.write('three\n')
+        self.assertEqual(list(tailer), ['two\n', 'three\n'])
+        self.assertEqual(tailer.bytes_read, 14)
+        tailer.close()
+
+    def test_split(self):
+        self.write('one\n')
+        self.tail()
+        self.write(''.join('line %d\n' % i for i in range(100)) + 'partial')
+        tailer = LogTail(self.log_file, self.state_file, block_size=16)
+        tailer.read_state()
+        ranges = tailer.split(4)
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[0][1], 4)
+        for (path, start, end), (next_path, next_start, next_end) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+
+        lines = []
+        for path, start, end in ranges:
+            f = open(path, 'rb')
+            lines.extend(iter_lines(read_blocks(f, start, end, block_size=16)))
+            f.close()
+        self.assertEqual(lines, ['line %d\n' % i for i in range(100)])
+
+        self.write(' line\n')
+        self.assertEqual(list(tailer), ['partial line\n'])
+        tailer.close()
+
+if __name__ == '__main__':
+    unittest.main()
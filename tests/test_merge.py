@@ -0,0 +1,101 @@
+from logster.parsers.SampleLogster import SampleLogster
+from logster.parsers.SquidLogster import SquidLogster
+from logster.parsers.PostfixLogster import PostfixLogster
+from logster.parsers.ErrorLogLogster import ErrorLogLogster
+from logster.parsers.LineCountLogster import LineCountLogster
+from logster.parsers.Log4jLogster import Log4jLogster
+from logster.parsers.MetricLogster import MetricLogster
+from logster.parsers.JsonLogster import JsonLogster
+from parser_helper import parse_each_line, metric_values
+import pickle
+import unittest
+
+class TestMerge(unittest.TestCase):
+    '''Parsing a log in two parts and merging must match parsing it in one go.'''
+
+    def assertMergeMatches(self, parser_class, lines, option_string=None):
+        whole = parse_each_line(parser_class(option_string), lines)
+        half = len(lines) // 2
+        merged = parse_each_line(parser_class(option_string), lines[:half])
+        merged.merge(parse_each_line(parser_class(option_string), lines[half:]))
+        self.assertEqual(metric_values(merged), metric_values(whole))
+
+    def test_sample(self):
+        self.assertMergeMatches(SampleLogster, [
+            '127.0.0.1 - - [01/Jan/2015:00:00:00 +0000] "GET / HTTP/1.1" 200 512 "-" "curl"',
+            '127.0.0.1 - - [01/Jan/2015:00:00:01 +0000] "GET /a HTTP/1.1" 404 0 "-" "curl"',
+            'garbage',
+            '127.0.0.1 - - [01/Jan/2015:00:00:02 +0000] "GET /b HTTP/1.0" 200 10 "-" "curl"',
+        ])
+
+    def test_squid(self):
+        self.assertMergeMatches(SquidLogster, [
+            '1420070400.000    100 10.0.0.1 TCP_MISS/200 1024 GET http://example.com/ - DIRECT/1.2.3.4 text/html',
+            '1420070401.000     50 10.0.0.1 TCP_HIT/200 2048 GET http://example.com/ - NONE/- text/html',
+            '1420070402.000     10 10.0.0.1 TCP_DENIED/403 0 GET http://example.com/ - NONE/- text/html',
+            '1420070403.000     10 10.0.0.1 TCP_REFRESH_MISS/304 10 GET http://example.com/ - DIRECT/1.2.3.4 -',
+        ])
+
+    def test_postfix(self):
+        self.assertMergeMatches(PostfixLogster, [
+            'Jan  1 00:00:00 mx postfix/smtp[1]: ABC: to=<a@b.c>, relay=x[1.2.3.4]:25, delay=1.5, delays=0/0/0/1.5, dsn=2.0.0, status=sent (250 ok)',
+            'Jan  1 00:00:01 mx postfix/smtp[1]: ABD: to=<a@b.c>, relay=none, delay=30, delays=0/0/30/0, dsn=4.4.1, status=deferred (timeout)',
+            'Jan  1 00:00:02 mx postfix/smtp[1]: ABE: to=<a@b.c>, relay=x[1.2.3.4]:25, delay=0.5, delays=0/0/0/0.5, dsn=2.0.0, status=sent (250 ok)',
+            'Jan  1 00:00:03 mx postfix/smtp[1]: ABF: to=<a@b.c>, relay=x[1.2.3.4]:25, delay=2, delays=0/0/0/2, dsn=5.1.1, status=bounced (unknown)',
+        ])
+
+    def test_error_log(self):
+        self.assertMergeMatches(ErrorLogLogster, [
+            '[Thu Jan 01 00:00:00 2015] [error] [client 1.2.3.4] File does not exist',
+            '[Thu Jan 01 00:00:01 2015] [notice] Apache configured',
+            '[Thu Jan 01 00:00:02 2015] [warn] something',
+            '[Thu Jan 01 00:00:03 2015] [error] [client 1.2.3.4] File does not exist',
+        ])
+
+    def test_line_count(self):
+        self.assertMergeMatches(LineCountLogster, ['a', 'b', 'c'])
+
+    def test_log4j(self):
+        self.assertMergeMatches(Log4jLogster, [
+            '2015-01-01 00:00:00,000 WARN  [main] something',
+            '2015-01-01 00:00:01,000 ERROR [main] failed',
+            '2015-01-01 00:00:02,000 INFO  [main] hello',
+            '2015-01-01 00:00:03,000 ERROR [main] failed again',
+        ])
+
+    def test_metric(self):
+        self.assertMergeMatches(MetricLogster, [
+            'INFO METRIC_TIME metric=some.metric.time value=10ms',
+            'INFO METRIC_COUNT metric=some.metric.count value=1 ',
+            'INFO METRIC_TIME metric=some.metric.time value=11ms',
+            'INFO METRIC_TIME metric=other.metric.time value=5ms',
+            'INFO METRIC_COUNT metric=some.metric.count value=2.2 ',
+            'INFO METRIC_TIME metric=some.metric.time value=20ms',
+        ], '--percentiles 25,75,90')
+
+    def test_metric_ddsketch(self):
+        self.assertMergeMatches(MetricLogster, [
+            'INFO METRIC_TIME metric=some.metric.time value=10ms',
+            'INFO METRIC_TIME metric=some.metric.time value=11ms',
+            'INFO METRIC_TIME metric=other.metric.time value=5ms',
+            'INFO METRIC_TIME metric=some.metric.time value=20ms',
+        ], '--percentiles 25,75,90 --quantile-engine ddsketch')
+
+    def test_metric_pickles(self):
+        parser = parse_each_line(MetricLogster('--max-samples 10'), [
+            'INFO METRIC_TIME metric=some.metric.time value=10ms',
+            'INFO METRIC_TIME metric=some.metric.time value=20ms',
+        ])
+        copy = pickle.loads(pickle.dumps(parser))
+        self.assertEqual(copy.times['some.metric.time'].unit, 'ms')
+        self.assertEqual(list(copy.times['some.metric.time'].values.values), [10.0, 20.0])
+
+    def test_json(self):
+        self.assertMergeMatches(JsonLogster, [
+            '{"a": 1, "b": {"c": 2}}',
+            '{"a": 3}',
+            '{"b": {"c": 4}, "d": 5}',
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+from logster.logster_helper import NSCA, NSCAException
+import ctypes
+import socket
+import struct
+import threading
+import unittest
+import zlib
+
+class FakeNSCAServer(threading.Thread):
+    '''Accepts one connection, sends an init packet and keeps what it receives.'''
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.iv = bytes(bytearray(range(128)))
+        self.timestamp = 1420070400
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.received = b''
+
+    def run(self):
+        conn, address = self.sock.accept()
+        conn.sendall(self.iv + struct.pack('!I', self.timestamp))
+        while True:
+            data = conn.recv(4096)
+            if not data:
+                break
+            self.received += data
+        conn.close()
+        self.sock.close()
+
+def data_packet(output_length):
+    '''The data_packet struct of an NSCA server built with output_length,
+    as common.h of NSCA 2.9 declares it, in network byte order.'''
+    class DataPacket(ctypes.BigEndianStructure):
+        _fields_ = [
+            ('packet_version', ctypes.c_int16),
+            ('crc32_value', ctypes.c_uint32),
+            ('timestamp', ctypes.c_uint32),
+            ('return_code', ctypes.c_int16),
+            ('host_name', ctypes.c_char * 64),
+            ('svc_description', ctypes.c_char * 128),
+            ('plugin_output', ctypes.c_char * output_length),
+        ]
+    return DataPacket
+
+class TestNSCA(unittest.TestCase):
+
+    def send(self, checks, password='', encryption='none'):
+        server = FakeNSCAServer()
+        server.start()
+        NSCA('127.0.0.1', server.port, password, encryption).send(checks)
+        server.join(5)
+        return server
+
+    def unpack(self, data, output_length=4096):
+        packets = []
+        packet_format = NSCA('127.0.0.1', 5667, output_length=output_length).packet_format
+        size = struct.calcsize(packet_format)
+        for i in range(0, len(data), size):
+            fields = list(struct.unpack(packet_format, data[i:i + size]))
+            crc = fields[1]
+            fields[1] = 0
+            self.assertEqual(crc, zlib.crc32(struct.pack(packet_format, *fields)) & 0xffffffff)
+            packets.append((fields[0], fields[2], fields[3]) + tuple(f.rstrip(b'\0') for f in fields[4:]))
+        return packets
+
+    def test_packet_size(self):
+        # 4304 bytes for NSCA 2.9 and 720 for NSCA 2.7.
+        for output_length in (4096, 512):
+            self.assertEqual(struct.calcsize(NSCA('127.0.0.1', 5667, output_length=output_length).packet_format),
+                             ctypes.sizeof(data_packet(output_length)))
+        self.assertEqual(ctypes.sizeof(data_packet(4096)), 4304)
+        self.assertEqual(ctypes.sizeof(data_packet(512)), 720)
+
+    def test_packet_layout(self):
+        for output_length in (4096, 512):
+            nsca = NSCA('127.0.0.1', 5667, output_length=output_length)
+            packet = data_packet(output_length).from_buffer_copy(nsca.packet(1420070400, 'web01', 'http_5xx', 2, 'errors'))
+            self.assertEqual((packet.packet_version, packet.timestamp, packet.return_code),
+                             (3, 1420070400, 2))
+            self.assertEqual((packet.host_name, packet.svc_description, packet.plugin_output),
+                             (b'web01', b'http_5xx', b'errors'))
+
+    def test_send(self):
+        server = self.send([('web01', 'http_2xx', 0, 'ok'), ('web01', 'http_5xx', 2, 'errors')])
+        self.assertEqual(self.unpack(server.received), [
+            (3, server.timestamp, 0, b'web01', b'http_2xx', b'ok'),
+            (3, server.timestamp, 2, b'web01', b'http_5xx', b'errors'),
+        ])
+
+    def test_send_xor(self):
+        server = self.send([('web01', 'http_2xx', 1, 'warn')], password='secret', encryption='xor')
+        decrypted = NSCA('127.0.0.1', server.port, 'secret', 'xor').encrypt(server.received, server.iv)
+        self.assertEqual(self.unpack(decrypted), [(3, server.timestamp, 1, b'web01', b'http_2xx', b'warn')])
+
+    def test_unsupported_encryption(self):
+        self.assertRaises(NSCAException, NSCA, '127.0.0.1', 5667, 'secret', 'des')
+
+if __name__ == '__main__':
+    unittest.main()
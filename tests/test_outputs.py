@@ -0,0 +1,78 @@
+from logster import logster
+from logster.logster_helper import MetricObject
+import cPickle
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+
+class TestGraphitePayload(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [('a.b', 1, 100), ('c', 2.5, 160)]
+
+    def unpickle(self, payload):
+        '''Split a pickle protocol payload into its unpickled messages.'''
+        messages = []
+        while payload:
+            length, = struct.unpack('!L', payload[:4])
+            messages.append(cPickle.loads(payload[4:4 + length]))
+            payload = payload[4 + length:]
+        return messages
+
+    def test_plaintext(self):
+        self.assertEqual(logster.graphite_payload(self.records, 'plaintext'), 'a.b 1 100\nc 2.5 160\n')
+        self.assertEqual(logster.graphite_payload([], 'plaintext'), '')
+
+    def test_pickle(self):
+        payload = logster.graphite_payload(self.records, 'pickle')
+        self.assertEqual(struct.unpack('!L', payload[:4])[0], len(payload) - 4)
+        self.assertEqual(self.unpickle(payload), [[('a.b', (100, 1)), ('c', (160, 2.5))]])
+        self.assertEqual(logster.graphite_payload([], 'pickle'), '')
+
+    def test_pickle_batches(self):
+        records = [('m%s' % i, i, 100) for i in range(2 * logster.graphite_pickle_batch_size + 1)]
+        messages = self.unpickle(logster.graphite_payload(records, 'pickle'))
+        self.assertEqual([len(message) for message in messages], [500, 500, 1])
+        self.assertEqual([name for message in messages for name, point in message],
+                         [name for name, value, timestamp in records])
+
+class TestStatsd(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_packets_fill_up_to_mtu(self):
+        metrics = ['a:1|c', 'b:2|c', 'c:3|c']
+        # Two metrics and their newline are 11 bytes.
+        self.assertEqual(logster.pack_statsd_packets(metrics, 11), ['a:1|c\nb:2|c', 'c:3|c'])
+        self.assertEqual(logster.pack_statsd_packets(metrics, 10), metrics)
+        self.assertEqual(logster.pack_statsd_packets(metrics, 17), ['a:1|c\nb:2|c\nc:3|c'])
+        self.assertEqual(logster.pack_statsd_packets([], 17), [])
+
+    def test_metric_longer_than_mtu(self):
+        long_metric = 'x' * 20 + ':1|c'
+        self.assertEqual(logster.pack_statsd_packets(['a:1|c', long_metric, 'b:2|c'], 11),
+                         ['a:1|c', long_metric, 'b:2|c'])
+
+    def test_types(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.settimeout(5)
+        try:
+            options, arguments = logster.get_cmdline_optparse().parse_args(
+                ['-s', self.dir, '--statsd-host', '127.0.0.1:%s' % sock.getsockname()[1]])
+            logster.submit_statsd([MetricObject('hits', 3, type='counter'),
+                                   MetricObject('latency', 12.5, type='timer'),
+                                   MetricObject('load', 0.5),
+                                   MetricObject('users', 7, type='int')], options)
+            self.assertEqual(sock.recv(65536), 'hits:3|c\nlatency:12.5|ms\nload:0.5|g\nusers:7|g')
+        finally:
+            sock.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+from logster.logster_helper import LogsterParser, LogsterParsingException
+from logster.parsers.SampleLogster import SampleLogster
+from logster.parsers.SquidLogster import SquidLogster
+from logster.parsers.ErrorLogLogster import ErrorLogLogster
+from logster.parsers.Log4jLogster import Log4jLogster
+from parser_helper import parse_each_line, metric_values
+import unittest
+
+class TestParseLines(unittest.TestCase):
+    '''parse_lines on a block must give the same results as parse_line on each line.'''
+
+    def assertBlockMatches(self, parser_class, lines):
+        by_line = parse_each_line(parser_class(), lines)
+
+        by_block = parser_class()
+        by_block.parse_lines(''.join(lines))
+
+        by_list = parser_class()
+        by_list.parse_lines(lines)
+
+        expected = metric_values(by_line)
+        self.assertEqual(metric_values(by_block), expected)
+        self.assertEqual(metric_values(by_list), expected)
+
+        skipped = len([line for line in lines if by_line.parse_line(line) == by_line.SKIPPED])
+        self.assertEqual(by_block._lines_skipped, skipped)
+        self.assertEqual(by_list._lines_skipped, skipped)
+
+    def test_default_parse_lines(self):
+        class LengthLogster(LogsterParser):
+            def __init__(self):
+                self.lines = []
+            def parse_line(self, line):
+                if line.startswith('skip'):
+                    raise LogsterParsingException('skipped')
+                self.lines.append(line)
+
+        parser = LengthLogster()
+        parser.parse_lines('one\nskip me\ntwo\n')
+        parser.parse_lines(['three\n'])
+        self.assertEqual(parser.lines, ['one\n', 'two\n', 'three\n'])
+        self.assertEqual(parser._lines_failed, 1)
+        self.assertEqual(parser._lines_skipped, 0)
+
+    def test_parse_line_status(self):
+        class StatusLogster(LogsterParser):
+            def __init__(self):
+                self.lines = []
+            def parse_line(self, line):
+                if line.startswith('skip'):
+                    return self.SKIPPED
+                if line.startswith('bad'):
+                    return self.ERROR
+                self.lines.append(line)
+
+        parser = StatusLogster()
+        parser.parse_lines('one\nskip me\nbad\ntwo\nskip\n')
+        self.assertEqual(parser.lines, ['one\n', 'two\n'])
+        self.assertEqual(parser._lines_skipped, 2)
+        self.assertEqual(parser._lines_failed, 1)
+        self.assertEqual(StatusLogster._lines_skipped, 0)
+
+    def test_sample(self):
+        self.assertBlockMatches(SampleLogster, [
+            '127.0.0.1 - - [01/Jan/2015:00:00:00 +0000] "GET / HTTP/1.1" 200 512 "-" "curl"\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:01 +0000] "GET /a HTTP/1.1" 404 0 "-" "curl"\n',
+            'garbage\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:02 +0000] "GET /b HTTP/1.0" 503 10 "-" "curl"\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:03 +0000] "GET /c HTTP/1.0" 101 10 "-" "curl"\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:04 +0000] "GET /d HTTP/1.0" 302 10 "-" "curl"\n',
+        ])
+
+    def test_squid(self):
+        self.assertBlockMatches(SquidLogster, [
+            '1420070400.000    100 10.0.0.1 TCP_MISS/200 1024 GET http://example.com/ - DIRECT/1.2.3.4 text/html\n',
+            '1420070401.000     50 10.0.0.1 TCP_HIT/200 2048 GET http://example.com/ - NONE/- text/html\n',
+            'garbage\n',
+            '1420070402.000     10 10.0.0.1 TCP_DENIED/403 0 GET http://example.com/ - NONE/- text/html\n',
+            '1420070403.000     10 10.0.0.1 TCP_REFRESH_MISS/304 10 GET http://example.com/ - DIRECT/1.2.3.4 -\n',
+        ])
+
+    def test_error_log(self):
+        self.assertBlockMatches(ErrorLogLogster, [
+            '[Thu Jan 01 00:00:00 2015] [error] [client 1.2.3.4] File does not exist\n',
+            '[Thu Jan 01 00:00:01 2015] [notice] Apache configured\n',
+            'garbage\n',
+            '[Thu Jan 01 00:00:02 2015] [warn] something\n',
+            '[Thu Jan 01 00:00:03 2015] [debug] something else\n',
+            '[Thu Jan 01 00:00:04 2015] [crit] oh no\n',
+        ])
+
+    def test_log4j(self):
+        self.assertBlockMatches(Log4jLogster, [
+            '2015-01-01 00:00:00,000 WARN  [main] something\n',
+            '2015-01-01 00:00:01,000 ERROR [main] failed\n',
+            '2015-01-01 00:00:02,000 INFO  [main] hello\n',
+            '2015-01-01 00:00:03,000 FATAL [main] failed again\n',
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
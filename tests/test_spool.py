@@ -0,0 +1,140 @@
+from logster.logster_helper import Spool
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from time import time
+
+class FakeGraphiteServer(threading.Thread):
+    '''Accepts a number of connections and keeps what they send.'''
+
+    def __init__(self, sock, connections):
+        threading.Thread.__init__(self)
+        self.sock = sock
+        self.connections = connections
+        self.received = b''
+
+    def run(self):
+        for i in range(self.connections):
+            conn, address = self.sock.accept()
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    break
+                self.received += data
+            conn.close()
+        self.sock.close()
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'test.spool')
+        self.sent = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def send(self, records):
+        self.sent.append(records)
+
+    def test_replay_in_batches(self):
+        spool = Spool(self.path)
+        spool.append([['a', 1, 100]])
+        spool.append([['b', 2, 160], ['c', 3, 160]])
+        spool.append([['d', 4, 220]])
+        self.assertEqual(len(spool), 4)
+
+        self.assertEqual(spool.replay(self.send, batch_size=3), 4)
+        self.assertEqual(self.sent, [[['a', 1, 100], ['b', 2, 160], ['c', 3, 160]],
+                                     [['d', 4, 220]]])
+        self.assertEqual(len(spool), 0)
+        self.assertEqual(spool.replay(self.send), 0)
+
+    def test_nothing_spooled(self):
+        self.assertEqual(Spool(self.path).replay(self.send), 0)
+        self.assertEqual(self.sent, [])
+
+    def test_failed_replay_keeps_records(self):
+        spool = Spool(self.path)
+        spool.append(['a:1|c'])
+        spool.append(['b:2|c'])
+
+        def send(records):
+            if records == ['b:2|c']:
+                raise socket.error('down')
+            self.sent.append(records)
+
+        self.assertRaises(socket.error, spool.replay, send, 1)
+        self.assertEqual(self.sent, [['a:1|c']])
+        spool.replay(self.send)
+        self.assertEqual(self.sent, [['a:1|c'], ['b:2|c']])
+
+    def test_strings_come_back_as_bytes(self):
+        spool = Spool(self.path)
+        spool.append([['a.b', 1.5, 100]])
+        spool.replay(self.send)
+        self.assertTrue(isinstance(self.sent[0][0][0], bytes))
+
+    def test_max_size_drops_oldest(self):
+        spool = Spool(self.path, max_size=200)
+        for i in range(10):
+            spool.append([['metric%s' % i, i, 100]])
+        self.assertTrue(os.path.getsize(self.path) <= 200)
+        spool.replay(self.send)
+        names = [record[0] for records in self.sent for record in records]
+        self.assertTrue(0 < len(names) < 10)
+        self.assertEqual(names[-1], b'metric9')
+
+        Spool(self.path, max_size=10).append([['too big', 1, 100]])
+        self.assertEqual(len(spool), 0)
+
+    def test_max_age(self):
+        f = open(self.path, 'w')
+        f.write('{"time": %s, "records": [["old", 1, 100]]}\n' % (time() - 120))
+        f.write('{"time": %s, "records": [["new", 2, 160]]}\n' % (time() - 30))
+        f.close()
+
+        Spool(self.path, max_age=60).replay(self.send)
+        self.assertEqual(self.sent, [[['new', 2, 160]]])
+
+    def test_unfinished_line_is_skipped(self):
+        spool = Spool(self.path)
+        spool.append([['a', 1, 100]])
+        f = open(self.path, 'a')
+        f.write('{"time": 1, "reco')
+        f.close()
+        spool.append([['b', 2, 160]])
+        spool.replay(self.send)
+        self.assertEqual(self.sent, [[['a', 1, 100], ['b', 2, 160]]])
+
+    def test_replay_to_listener(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+        def send(records):
+            conn = socket.create_connection(('127.0.0.1', port), 5)
+            conn.sendall(b''.join([b'%s %s %s\n' % tuple(record) for record in records]))
+            conn.close()
+
+        # Nothing is listening yet, so the metrics stay in the spool.
+        spool = Spool(self.path)
+        spool.append([['a', 1, 100]])
+        self.assertRaises(socket.error, spool.replay, send)
+        self.assertEqual(len(spool), 1)
+
+        sock.listen(1)
+        server = FakeGraphiteServer(sock, 1)
+        server.start()
+        spool.append([['b', 2, 160]])
+        self.assertEqual(spool.replay(send), 2)
+        server.join(5)
+        self.assertEqual(server.received, b'a 1 100\nb 2 160\n')
+        self.assertEqual(len(spool), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
 from logster.parsers import stats_helper
+from array import array
+import random
 import unittest
 
 class TestStatsHelper(unittest.TestCase):
@@ -63,3 +65,135 @@ class TestStatsHelper(unittest.TestCase):
 
     def test_90th_1_to_15_noncontiguous(self):
         self.assertAlmostEqual(stats_helper.find_percentile([1,2,3,4,5,6,7,8,9,15],90), 9.6)
+
+class TestSummarize(unittest.TestCase):
+
+    def test_matches_find_functions(self):
+        numbers = [5, 1, 4, 2, 3, 10, 7]
+        summary = stats_helper.summarize(numbers, [10, 90])
+        self.assertEqual(numbers, [5, 1, 4, 2, 3, 10, 7])
+        self.assertEqual(summary['count'], 7)
+        self.assertEqual(summary['min'], 1)
+        self.assertEqual(summary['max'], 10)
+        self.assertAlmostEqual(summary['mean'], stats_helper.find_mean(numbers))
+        self.assertEqual(summary['median'], stats_helper.find_median(list(numbers)))
+        self.assertAlmostEqual(summary['percentiles'][10], stats_helper.find_percentile(list(numbers), 10))
+        self.assertAlmostEqual(summary['percentiles'][90], stats_helper.find_percentile(list(numbers), 90))
+        self.assertAlmostEqual(summary['stddev'], 2.8713930346)
+
+    def test_array(self):
+        summary = stats_helper.summarize(array('d', [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]), [90])
+        self.assertAlmostEqual(summary['percentiles'][90], 9.1)
+        self.assertAlmostEqual(summary['mean'], 5.5)
+
+    def test_empty(self):
+        summary = stats_helper.summarize([], [90])
+        self.assertEqual(summary['count'], 0)
+        self.assertEqual(summary['mean'], None)
+        self.assertEqual(summary['percentiles'], {90: None})
+
+class TestQuantileEngines(unittest.TestCase):
+
+    def setUp(self):
+        generator = random.Random(42)
+        self.values = [generator.lognormvariate(3, 1) for i in range(10000)]
+
+    def fill(self, engine):
+        for value in self.values:
+            engine.add(value)
+        return engine
+
+    def test_exact_matches_find_percentile(self):
+        engine = self.fill(stats_helper.ExactQuantiles())
+        self.assertEqual(engine.percentile(90), stats_helper.find_percentile(list(self.values), 90))
+        self.assertAlmostEqual(engine.mean(), stats_helper.find_mean(self.values))
+
+    def test_ddsketch_relative_accuracy(self):
+        sketch = self.fill(stats_helper.DDSketch(0.01))
+        for percentile in (1, 25, 50, 75, 90, 99):
+            exact = stats_helper.find_percentile(list(self.values), percentile)
+            self.assertTrue(abs(sketch.percentile(percentile) - exact) <= 0.011 * exact, percentile)
+        self.assertAlmostEqual(sketch.mean(), stats_helper.find_mean(self.values))
+        self.assertEqual(sketch.percentile(0), min(self.values))
+        self.assertEqual(sketch.percentile(100), max(self.values))
+        self.assertTrue(len(sketch.positive) < 1000)
+
+    def test_ddsketch_zero_and_negative(self):
+        sketch = stats_helper.DDSketch(0.01)
+        for value in (-10, -1, 0, 0, 1, 10):
+            sketch.add(value)
+        self.assertEqual(sketch.percentile(0), -10)
+        self.assertEqual(sketch.percentile(50), 0)
+        self.assertAlmostEqual(sketch.percentile(20), -1, delta=0.01)
+        self.assertAlmostEqual(sketch.percentile(80), 1, delta=0.01)
+
+    def test_ddsketch_bounded_buckets(self):
+        sketch = stats_helper.DDSketch(0.01, max_buckets=50)
+        for value in self.values:
+            sketch.add(value)
+        self.assertEqual(len(sketch.positive), 50)
+        self.assertEqual(len(sketch), len(self.values))
+        exact = stats_helper.find_percentile(list(self.values), 99)
+        self.assertTrue(abs(sketch.percentile(99) - exact) <= 0.011 * exact)
+
+    def test_ddsketch_merge(self):
+        whole = self.fill(stats_helper.DDSketch())
+        first = stats_helper.DDSketch()
+        second = stats_helper.DDSketch()
+        for value in self.values[:5000]:
+            first.add(value)
+        for value in self.values[5000:]:
+            second.add(value)
+        first.merge(second)
+        self.assertEqual(first.positive, whole.positive)
+        self.assertEqual(first.percentile(90), whole.percentile(90))
+        self.assertRaises(ValueError, first.merge, stats_helper.DDSketch(0.05))
+
+    def test_reservoir_keeps_exact_totals(self):
+        random.seed(1)
+        engine = self.fill(stats_helper.ExactQuantiles(max_samples=1000))
+        self.assertEqual(len(engine.values), 1000)
+        self.assertEqual(len(engine), len(self.values))
+        summary = engine.summarize([90])
+        self.assertEqual(summary['count'], len(self.values))
+        self.assertAlmostEqual(summary['mean'], stats_helper.find_mean(self.values))
+        self.assertEqual(summary['min'], min(self.values))
+        self.assertEqual(summary['max'], max(self.values))
+        exact = stats_helper.find_percentile(list(self.values), 50)
+        self.assertTrue(abs(summary['median'] - exact) < 0.1 * exact)
+
+    def test_reservoir_below_limit_is_exact(self):
+        engine = self.fill(stats_helper.ExactQuantiles(max_samples=len(self.values)))
+        self.assertFalse(engine.sampled)
+        self.assertEqual(engine.percentile(90), stats_helper.find_percentile(list(self.values), 90))
+
+    def test_reservoir_merge(self):
+        random.seed(1)
+        first = stats_helper.ExactQuantiles(max_samples=1000)
+        second = stats_helper.ExactQuantiles(max_samples=1000)
+        for value in self.values[:9000]:
+            first.add(value)
+        for value in self.values[9000:]:
+            second.add(value)
+        first.merge(second)
+        self.assertEqual(len(first.values), 1000)
+        self.assertEqual(len(first), len(self.values))
+        self.assertAlmostEqual(first.mean(), stats_helper.find_mean(self.values))
+        self.assertEqual(first.max, max(self.values))
+
+    def test_summarize(self):
+        exact = self.fill(stats_helper.ExactQuantiles()).summarize([90])
+        sketch = self.fill(stats_helper.DDSketch()).summarize([90])
+        self.assertEqual(sketch['count'], exact['count'])
+        self.assertEqual(sketch['max'], exact['max'])
+        self.assertAlmostEqual(sketch['stddev'], exact['stddev'], 6)
+        self.assertTrue(abs(sketch['percentiles'][90] - exact['percentiles'][90]) <= 0.011 * exact['percentiles'][90])
+
+    def test_empty(self):
+        for engine in (stats_helper.ExactQuantiles(), stats_helper.DDSketch()):
+            self.assertEqual(engine.percentile(90), None)
+            self.assertEqual(engine.mean(), None)
+            self.assertEqual(engine.summarize([90])['percentiles'], {90: None})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,248 @@
+from logster import logster
+from logster.logster_helper import MetricObject, LogsterParser
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from time import time
+
+class TestSpooling(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.send_graphite = logster.send_graphite
+        self.submit_statsd = logster.output_senders['statsd']
+        self.release = threading.Event()
+
+    def tearDown(self):
+        logster.send_graphite = self.send_graphite
+        logster.output_senders['statsd'] = self.submit_statsd
+        # Let any output thread that is still hanging finish before the
+        # spool goes away.
+        self.release.set()
+        for thread in threading.enumerate():
+            if thread.name.startswith('logster-'):
+                thread.join(5)
+        shutil.rmtree(self.dir)
+
+    def options(self, *args):
+        options, arguments = logster.get_cmdline_optparse().parse_args(['-s', self.dir] + list(args))
+        return options
+
+    def spooled(self, options, output='graphite'):
+        '''Read the spool without its lock, which a hung output may hold.'''
+        path = logster.get_spool(output, getattr(options, output + '_host'), options).path
+        if not os.path.exists(path):
+            return None
+        f = open(path)
+        try:
+            return [record for line in f for record in json.loads(line)['records']]
+        finally:
+            f.close()
+
+    def test_hung_output_keeps_its_metrics(self):
+        timeouts = []
+        def hang(host, port, payload, keep_open, timeout=None):
+            # Stands in for a connect() to a server that never answers.
+            timeouts.append(timeout)
+            self.release.wait(5)
+            raise socket.timeout('timed out')
+        logster.send_graphite = hang
+
+        options = self.options('-o', 'graphite', '--graphite-host', '127.0.0.1:2003', '--output-timeout', '0.2')
+        metrics = [MetricObject('a', 1, timestamp=100), MetricObject('b', 2, timestamp=100)]
+        self.assertEqual(logster.submit_metrics(metrics, options), ['graphite'])
+        self.assertEqual(self.spooled(options), [['a', 1, 100], ['b', 2, 100]])
+        self.assertTrue(timeouts[0] < 0.2)
+
+    def test_spooled_metrics_are_sent_first(self):
+        payloads = []
+        def send(host, port, payload, keep_open, timeout=None):
+            if not payloads:
+                payloads.append(None)
+                raise socket.error('refused')
+            payloads.append(payload)
+        logster.send_graphite = send
+
+        options = self.options('-o', 'graphite', '--graphite-host', '127.0.0.1:2003')
+        self.assertEqual(logster.submit_metrics([MetricObject('a', 1, timestamp=100)], options), ['graphite'])
+        self.assertEqual(logster.submit_metrics([MetricObject('b', 2, timestamp=160)], options), [])
+        self.assertEqual(payloads[1:], ['a 1 100\n', 'b 2 160\n'])
+        self.assertEqual(self.spooled(options), [])
+
+    def test_sent_metrics_are_not_spooled(self):
+        payloads = []
+        def send(host, port, payload, keep_open, timeout=None):
+            payloads.append(payload)
+        logster.send_graphite = send
+
+        # Far more metrics than the spool could hold.
+        options = self.options('-o', 'graphite', '--graphite-host', '127.0.0.1:2003', '--spool-max-size', '300')
+        metrics = [MetricObject('metric%s' % i, i, timestamp=100) for i in range(50)]
+        self.assertEqual(logster.submit_metrics(metrics, options), [])
+        self.assertEqual(len(payloads[0].splitlines()), 50)
+        self.assertEqual(self.spooled(options), None)
+
+    def test_statsd_spools_only_gauges(self):
+        def refuse(metrics, options, timeout=None):
+            raise socket.error('refused')
+        logster.output_senders['statsd'] = refuse
+
+        options = self.options('-o', 'statsd', '--statsd-host', '127.0.0.1:8125')
+        metrics = [MetricObject('hits', 3, type='counter'), MetricObject('latency', 12.5, type='timer'),
+                   MetricObject('load', 0.5)]
+        self.assertEqual(logster.submit_metrics(metrics, options), ['statsd'])
+        self.assertEqual(self.spooled(options, 'statsd'), ['load:0.5|g'])
+
+class TestSubmitMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.senders = dict(logster.output_senders)
+        self.send_nsca = logster.send_nsca
+        self.release = threading.Event()
+        self.calls = []
+
+    def tearDown(self):
+        logster.output_senders.clear()
+        logster.output_senders.update(self.senders)
+        logster.send_nsca = self.send_nsca
+        self.release.set()
+        for thread in threading.enumerate():
+            if thread.name.startswith('logster-'):
+                thread.join(5)
+        shutil.rmtree(self.dir)
+
+    def options(self, *args):
+        options, arguments = logster.get_cmdline_optparse().parse_args(['-s', self.dir] + list(args))
+        return options
+
+    def stub(self, output, action=None):
+        '''Replace the sender of output with one that records the thread
+        it ran in and its timeout, then does action.'''
+        def send(metrics, options, timeout=None):
+            self.calls.append((output, threading.current_thread().name, timeout))
+            if action is not None:
+                action()
+        logster.output_senders[output] = send
+
+    def hang(self):
+        self.release.wait(5)
+
+    def fail(self):
+        raise socket.error('refused')
+
+    def test_output_timeouts(self):
+        timeouts = logster.get_output_timeouts(self.options())
+        self.assertEqual(timeouts, dict((output, logster.output_timeout) for output in logster.outputs))
+
+        timeouts = logster.get_output_timeouts(self.options('--output-timeout', '5'))
+        self.assertEqual(set(timeouts.values()), set([5.0]))
+
+        # Later values override earlier ones, whether for one output or all.
+        timeouts = logster.get_output_timeouts(self.options(
+            '--output-timeout', '5', '--output-timeout', 'graphite=2.5', '--output-timeout', 'statsd=1'))
+        self.assertEqual((timeouts['graphite'], timeouts['statsd'], timeouts['ganglia']), (2.5, 1.0, 5.0))
+        timeouts = logster.get_output_timeouts(self.options('--output-timeout', 'graphite=2', '--output-timeout', '7'))
+        self.assertEqual(timeouts['graphite'], 7.0)
+
+    def test_bad_output_timeouts(self):
+        for value in ['abc', '0', '-1', 'graphite=', 'graphite=x', 'bogus=1']:
+            options = self.options('-o', 'stdout', '--output-timeout', value)
+            self.assertRaises(ValueError, logster.get_output_timeouts, options)
+            self.assertTrue('--output-timeout' in logster.check_output_options(options))
+
+    def test_failed_outputs(self):
+        self.stub('graphite', self.fail)
+        self.stub('statsd')
+        self.stub('ganglia', self.hang)
+        options = self.options('-o', 'statsd', '-o', 'graphite', '-o', 'ganglia',
+                               '--output-timeout', '2', '--output-timeout', 'ganglia=0.1')
+        stats = logster.RunStats()
+
+        started = time()
+        self.assertEqual(logster.submit_metrics([MetricObject('a', 1)], options, stats), ['ganglia', 'graphite'])
+        self.assertTrue(time() - started < 1)
+        # A hung output is charged its whole timeout.
+        self.assertEqual(stats.submit_times['ganglia'], 0.1)
+        self.assertTrue(stats.submit_times['statsd'] < 1)
+        self.assertEqual(stats.metric_count, 1)
+        # Each sender gets part of its timeout for its sockets.
+        self.assertEqual(sorted([(output, timeout) for output, thread, timeout in self.calls]),
+                         [('ganglia', 0.05), ('graphite', 1.0), ('statsd', 1.0)])
+
+    def test_printing_outputs_run_inline(self):
+        self.stub('stdout')
+        self.stub('graphite')
+        main = threading.current_thread().name
+        options = self.options('-o', 'stdout', '-o', 'graphite', '--graphite-host', '127.0.0.1:2003')
+        self.assertEqual(logster.submit_metrics([MetricObject('a', 1)], options), [])
+        self.assertEqual(sorted([(output, thread) for output, thread, timeout in self.calls]),
+                         [('graphite', 'logster-graphite'), ('stdout', main)])
+
+        # --dry-run only prints, so every output runs inline.
+        self.calls = []
+        options.dry_run = True
+        self.assertEqual(logster.submit_metrics([MetricObject('a', 1)], options), [])
+        self.assertEqual(sorted([(output, thread) for output, thread, timeout in self.calls]),
+                         [('graphite', main), ('stdout', main)])
+
+    def test_send_nsca_failures(self):
+        options = self.options('-o', 'nsca', '--nsca-host', '127.0.0.1:5667')
+        for command in [os.path.join(self.dir, 'missing'), 'false']:
+            logster.send_nsca = command
+            self.assertEqual(logster.submit_metrics([MetricObject('a', 0)], options), ['nsca'])
+
+class TestRunStats(unittest.TestCase):
+
+    def test_line_counts(self):
+        options, arguments = logster.get_cmdline_optparse().parse_args([])
+        specs = logster.parser_specs('SampleLogster,MetricLogster,PostfixLogster,LineCountLogster', options)
+        parser = logster.new_parser(specs)
+        logster.feed_parser(parser, [''.join([
+            '127.0.0.1 - - [01/Jan/2015:00:00:00 +0000] "GET / HTTP/1.1" 200 512 "-" "curl"\n',
+            '127.0.0.1 - - [01/Jan/2015:00:00:01 +0000] "GET /a HTTP/1.1" 404 0 "-" "curl"\n',
+            '2015-01-01 00:00:02 INFO METRIC_COUNT metric=requests value=1 \n',
+            '2015-01-01 00:00:03 INFO METRIC_UNKNOWN metric=other value=1 \n',
+            'Jan  1 00:00:04 mx postfix/smtp[1]: ABC: to=<a@b>, delay=1.5, status=sent (250 ok)\n',
+            'garbage\n',
+        ])], count_lines=True)
+
+        metrics = dict((m.name, m.value) for m in logster.RunStats().get_metrics(parser, 'logster'))
+        self.assertEqual(metrics['logster.lines_read'], 6)
+        for name, matched in [('SampleLogster', 2), ('MetricLogster', 1), ('PostfixLogster', 1), ('LineCountLogster', 6)]:
+            self.assertEqual((metrics['logster.%s.lines_matched' % name], metrics['logster.%s.lines_skipped' % name]),
+                             (matched, 6 - matched))
+        self.assertFalse('logster.lock_wait' in metrics)
+
+    def test_parsers_of_the_same_class(self):
+        options, arguments = logster.get_cmdline_optparse().parse_args([])
+        parser = logster.new_parser(logster.parser_specs('LineCountLogster,SampleLogster,LineCountLogster', options))
+        self.assertEqual(logster.member_names(parser), ['LineCountLogster.0', 'SampleLogster', 'LineCountLogster.2'])
+        parser.parsers[2]._lines_skipped = 1
+        logster.feed_parser(parser, ['a\nb\n'], count_lines=True)
+
+        metrics = dict((m.name, m.value) for m in logster.RunStats().get_metrics(parser, ''))
+        self.assertEqual((metrics['LineCountLogster.0.lines_matched'], metrics['LineCountLogster.2.lines_matched']), (2, 1))
+        self.assertEqual(logster.member_names(parser.parsers[1]), ['SampleLogster'])
+
+    def test_parser_attributes_are_left_alone(self):
+        class ReadLogster(LogsterParser):
+            def __init__(self):
+                self.lines_read = self.bytes_read = 0
+            def parse_line(self, line):
+                self.lines_read += 1
+                self.bytes_read += 100
+
+        parser = ReadLogster()
+        logster.feed_parser(parser, ['a\nb\n', ['c\n']], count_lines=True)
+        self.assertEqual((parser.lines_read, parser.bytes_read), (3, 300))
+        metrics = dict((m.name, m.value) for m in logster.RunStats().get_metrics(parser, ''))
+        self.assertEqual((metrics['lines_read'], metrics['bytes_read']), (3, 6))
+
+if __name__ == '__main__':
+    unittest.main()